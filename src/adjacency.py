@@ -0,0 +1,77 @@
+from functools import lru_cache
+from utils import *
+from typing import Dict, Tuple
+
+Position = Tuple[int, int]
+Move = Tuple[Direction, Position]
+
+
+class Adjacency:
+    # Neighbours of the squares of a board, keyed by the flat id x * size + y.
+    # Shared by all maps and brains of one board size. Entries are worked out
+    # the first time a square is asked about, so a large board only pays for
+    # the squares the agent actually reaches.
+    def __init__(self, size: int):
+        self.size = size
+        self.neighbours: Dict[int, Tuple[Position, ...]] = {}
+        self.moves: Dict[int, Tuple[Move, ...]] = {}
+        self.clockwise: Dict[int, Tuple[Position, ...]] = {}
+
+    def cell_id(self, x: int, y: int) -> int:
+        return x * self.size + y
+
+    def around(self, x: int, y: int) -> Tuple[Position, ...]:
+        cell = x * self.size + y
+        neighbours = self.neighbours.get(cell)
+        if neighbours is None:
+            neighbours = self.neighbours[cell] = tuple(position for _, position in self.moves_of(x, y))
+        return neighbours
+
+    def moves_of(self, x: int, y: int) -> Tuple[Move, ...]:
+        # (direction, neighbour) pairs in the order of DIRECTION_DELTAS
+        cell = x * self.size + y
+        moves = self.moves.get(cell)
+        if moves is None:
+            last = self.size - 1
+            moves = []
+            if x > 0:
+                moves.append((Direction.UP, (x - 1, y)))
+            if x < last:
+                moves.append((Direction.DOWN, (x + 1, y)))
+            if y > 0:
+                moves.append((Direction.LEFT, (x, y - 1)))
+            if y < last:
+                moves.append((Direction.RIGHT, (x, y + 1)))
+            moves = self.moves[cell] = tuple(moves)
+        return moves
+
+    def clockwise_of(self, x: int, y: int) -> Tuple[Position, ...]:
+        # Up, right, down, left: the order the agent looks around in
+        cell = x * self.size + y
+        clockwise = self.clockwise.get(cell)
+        if clockwise is None:
+            neighbours = self.around(x, y)
+            clockwise = self.clockwise[cell] = tuple(
+                position for position in ((x - 1, y), (x, y + 1), (x + 1, y), (x, y - 1)) if position in neighbours
+            )
+        return clockwise
+
+    def neighbour_ids(self, cell: int) -> Tuple[int, ...]:
+        # Flat ids of the neighbours, computed on the spot for whole-board passes
+        size = self.size
+        x, y = divmod(cell, size)
+        ids = ()
+        if x > 0:
+            ids += (cell - size,)
+        if x < size - 1:
+            ids += (cell + size,)
+        if y > 0:
+            ids += (cell - 1,)
+        if y < size - 1:
+            ids += (cell + 1,)
+        return ids
+
+
+@lru_cache(maxsize=None)
+def adjacency(size: int) -> Adjacency:
+    return Adjacency(size)
@@ -1,54 +1,127 @@
-from pysat.solvers import Glucose3
 from utils import *
-from program import Map, Cell
-from typing import List, Tuple, Set
+from program import Map, Cell, SetState, freeze_set, thaw_set
+from knowledge import ClauseStore, KnowledgeState, VariableIndex
+from solvers import SatSolver
+from planner import PathPlanner, manhattan_distance, plan_actions
+from risk import RiskModel
+from adjacency import adjacency
+from typing import Any, Dict, List, NamedTuple, Tuple, Set, Optional
 from collections import deque
 
+
+class BrainState(NamedTuple):
+    visited_cells: SetState
+    safe_cells: SetState
+    dangerous_cells: SetState
+    frontier: SetState
+    known_cells: SetState
+    unknown_boundary: SetState
+    direction: Direction
+    has_gold: bool
+    last_positions: Tuple[Tuple[int, int], ...]
+    action_plan: Tuple
+    plan_goal: Optional[Tuple[int, int]]
+    entailed: SetState
+    possible: SetState
+    counters: Tuple[int, int, int, int]
+    knowledge: KnowledgeState
+    risk: Any
+
 class AgentBrain:
-    def __init__(self, map: Map):
+    def __init__(self, map: Map, solver: SatSolver = None, priors: Dict[Object, float] = None):
         self.map = map
-        self.knowledge_base = Glucose3()
+        self.knowledge_base = ClauseStore(solver)
+        self.var_index = VariableIndex(map.size)
+        self.planner = PathPlanner(map.size)
+        self.adjacency = adjacency(map.size)
+        self.risk = RiskModel(priors)
+        self.action_plan = deque()
+        self.plan_goal = None
         self.visited_cells = set()
         self.safe_cells = set()
         self.dangerous_cells = set()
-        self.unknown_cells = {(x, y) for x in range(map.size) for y in range(map.size)}
+
+        # Frontier: safe cells that have not been visited yet. Known cells are
+        # the ones classified so far, every other cell is unknown, and the
+        # unknown boundary holds the unknown cells next to a known one.
+        self.frontier = set()
+        self.known_cells = set()
+        self.unknown_boundary = set()
         self.direction = Direction.UP
         self.has_gold = False
         self.last_positions = deque(maxlen=3)  # Store last 3 positions to detect loops
+        self.solver_calls = 0
+
+        # Entailment cache: negative literals proven by the knowledge base stay
+        # proven forever, "possible" verdicts are dropped when a new clause
+        # mentions their variable
+        self.entailed = set()
+        self.possible = set()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.local_answers = 0
+        self.last_state: Optional[BrainState] = None
         self.initialize_knowledge_base()
 
     def initialize_knowledge_base(self):
         for x in range(self.map.size):
             for y in range(self.map.size):
-                cell_id = self.get_cell_id(x, y)
                 for obj in [Object.WUMPUS, Object.PIT, Object.POISONOUS_GAS, Object.GOLD, Object.HEALING_POTIONS]:
-                    self.knowledge_base.add_clause([-cell_id[obj], -cell_id[obj]])
-
-    def get_cell_id(self, x: int, y: int) -> dict:
-        return {
-            Object.WUMPUS: (x * self.map.size + y) * 6 + 1,
-            Object.PIT: (x * self.map.size + y) * 6 + 2,
-            Object.POISONOUS_GAS: (x * self.map.size + y) * 6 + 3,
-            Object.GOLD: (x * self.map.size + y) * 6 + 4,
-            Object.HEALING_POTIONS: (x * self.map.size + y) * 6 + 5,
-            Object.STENCH: (x * self.map.size + y) * 6 + 6,
-            Object.BREEZE: (x * self.map.size + y) * 6 + 7,
-            Object.WHIFF: (x * self.map.size + y) * 6 + 8,
-            Object.GLOW: (x * self.map.size + y) * 6 + 9,
-        }
+                    self.add_clause([-self.get_cell_id(x, y, obj)])
+
+    def close(self):
+        # Frees the solver; a solver handed in from a pool is released by its owner instead
+        self.knowledge_base.delete()
+
+    def snapshot(self) -> BrainState:
+        # Sets are stored as changes against the previous snapshot's base
+        previous = self.last_state
+
+        def freeze(name: str) -> SetState:
+            return freeze_set(getattr(self, name), getattr(previous, name) if previous else None)
+
+        self.last_state = BrainState(
+            freeze("visited_cells"), freeze("safe_cells"), freeze("dangerous_cells"),
+            freeze("frontier"), freeze("known_cells"), freeze("unknown_boundary"),
+            self.direction, self.has_gold, tuple(self.last_positions), tuple(self.action_plan), self.plan_goal,
+            freeze("entailed"), freeze("possible"),
+            (self.solver_calls, self.cache_hits, self.cache_misses, self.local_answers),
+            self.knowledge_base.snapshot(), self.risk.snapshot(),
+        )
+        return self.last_state
+
+    def restore(self, state: BrainState):
+        self.visited_cells = thaw_set(state.visited_cells)
+        self.safe_cells = thaw_set(state.safe_cells)
+        self.dangerous_cells = thaw_set(state.dangerous_cells)
+        self.frontier = thaw_set(state.frontier)
+        self.known_cells = thaw_set(state.known_cells)
+        self.unknown_boundary = thaw_set(state.unknown_boundary)
+        self.direction = state.direction
+        self.has_gold = state.has_gold
+        self.last_positions = deque(state.last_positions, maxlen=self.last_positions.maxlen)
+        self.action_plan = deque(state.action_plan)
+        self.plan_goal = state.plan_goal
+        self.entailed = thaw_set(state.entailed)
+        self.possible = thaw_set(state.possible)
+        self.solver_calls, self.cache_hits, self.cache_misses, self.local_answers = state.counters
+        self.knowledge_base.restore(state.knowledge)
+        self.risk.restore(state.risk)
+        self.planner.invalidate()
+        self.last_state = state
+
+    def get_cell_id(self, x: int, y: int, obj: Object) -> int:
+        return self.var_index.get(x, y, obj)
 
     def update_knowledge(self, perceptions: Set[Object]):
         x, y = self.map.agent_position
-        cell_id = self.get_cell_id(x, y)
 
-        self.visited_cells.add((x, y))
-        self.safe_cells.add((x, y))
-        self.unknown_cells.discard((x, y))
-        self.dangerous_cells.discard((x, y))
+        self.mark_visited((x, y))
         for obj in [Object.WUMPUS, Object.PIT, Object.POISONOUS_GAS]:
-            self.knowledge_base.add_clause([-cell_id[obj]])
+            self.add_clause([-self.get_cell_id(x, y, obj)])
 
         adjacent_cells = self.get_adjacent_cells(x, y)
+        self.risk.observe((x, y), perceptions, adjacent_cells)
 
         self.update_perception(Object.BREEZE, Object.PIT, perceptions, adjacent_cells)
         self.update_perception(Object.STENCH, Object.WUMPUS, perceptions, adjacent_cells)
@@ -59,44 +132,98 @@ class AgentBrain:
             if perception in perceptions:
                 for adj in adjacent_cells:
                     if adj not in self.visited_cells:
-                        self.dangerous_cells.add(adj)
-                        self.unknown_cells.discard(adj)
-                        self.safe_cells.discard(adj)
+                        self.mark_dangerous(adj)
             else:
                 for adj in adjacent_cells:
                     if adj not in self.visited_cells and adj not in self.dangerous_cells:
-                        self.safe_cells.add(adj)
-                        self.unknown_cells.discard(adj)
+                        self.mark_safe(adj)
+
+    def mark_visited(self, cell: Tuple[int, int]):
+        self.visited_cells.add(cell)
+        self.mark_safe(cell)
 
-    def update_perception(self, perception: Object, danger: Object, perceptions: Set[Object], adjacent_cells: List[Tuple[int, int]]):
+    def mark_safe(self, cell: Tuple[int, int]):
+        self.safe_cells.add(cell)
+        self.dangerous_cells.discard(cell)
+        if cell in self.visited_cells:
+            self.frontier.discard(cell)
+        else:
+            self.frontier.add(cell)
+        self.mark_known(cell)
+
+    def mark_dangerous(self, cell: Tuple[int, int]):
+        self.dangerous_cells.add(cell)
+        self.safe_cells.discard(cell)
+        self.frontier.discard(cell)
+        self.mark_known(cell)
+
+    def mark_known(self, cell: Tuple[int, int]):
+        if cell in self.known_cells:
+            return
+        self.known_cells.add(cell)
+        self.unknown_boundary.discard(cell)
+        for adj in self.get_adjacent_cells(*cell):
+            if adj not in self.known_cells:
+                self.unknown_boundary.add(adj)
+
+    def has_unknown_cells(self) -> bool:
+        return len(self.known_cells) < self.map.size * self.map.size
+
+    def update_perception(self, perception: Object, danger: Object, perceptions: Set[Object], adjacent_cells: Tuple[Tuple[int, int], ...]):
         if perception in perceptions:
-            danger_clause = [self.get_cell_id(ax, ay)[danger] for ax, ay in adjacent_cells]
-            self.knowledge_base.add_clause(danger_clause)
+            danger_clause = [self.get_cell_id(ax, ay, danger) for ax, ay in adjacent_cells]
+            self.add_clause(danger_clause)
         else:
             for ax, ay in adjacent_cells:
-                self.knowledge_base.add_clause([-self.get_cell_id(ax, ay)[danger]])
+                self.add_clause([-self.get_cell_id(ax, ay, danger)])
+
+    def add_clause(self, clause: List[int]):
+        if not self.knowledge_base.add_clause(clause):
+            return
+        for literal in clause:
+            self.possible.discard(abs(literal))
+
+    def solve(self, assumptions: List[int]) -> bool:
+        self.solver_calls += 1
+        return self.knowledge_base.solve(assumptions)
+
+    def is_absent(self, variable: int) -> bool:
+        # Percept clauses only contain positive danger literals, so the negation
+        # of a variable can only become entailed by a clause that mentions it
+        if -variable in self.entailed:
+            self.cache_hits += 1
+            return True
+        if variable in self.possible:
+            self.cache_hits += 1
+            return False
+
+        self.cache_misses += 1
+        absent = self.knowledge_base.local.is_absent(variable)
+        if absent is not None:
+            self.local_answers += 1
+        else:
+            absent = not self.solve([variable])
+
+        if not absent:
+            self.possible.add(variable)
+            return False
+        self.entailed.add(-variable)
+        return True
 
     def is_safe(self, x: int, y: int) -> bool:
-        cell_id = self.get_cell_id(x, y)
         return all(
-            not self.knowledge_base.solve(assumptions=[cell_id[obj]])
+            self.is_absent(self.get_cell_id(x, y, obj))
             for obj in [Object.WUMPUS, Object.PIT, Object.POISONOUS_GAS]
         )
 
     def is_dangerous(self, x: int, y: int) -> bool:
-        cell_id = self.get_cell_id(x, y)
         return any(
-            self.knowledge_base.solve(assumptions=[cell_id[obj]])
+            not self.is_absent(self.get_cell_id(x, y, obj))
             for obj in [Object.WUMPUS, Object.PIT, Object.POISONOUS_GAS]
         )
 
-    def get_adjacent_cells(self, x: int, y: int) -> List[Tuple[int, int]]:
-        adjacent = [(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)]
-        return [
-            (ax, ay)
-            for ax, ay in adjacent
-            if 0 <= ax < self.map.size and 0 <= ay < self.map.size
-        ]
+    def get_adjacent_cells(self, x: int, y: int) -> Tuple[Tuple[int, int], ...]:
+        return self.adjacency.around(x, y)
 
     def make_decision(self, perceptions: Set[Object]) -> Action:
         self.update_knowledge(perceptions)
@@ -108,13 +235,12 @@ class AgentBrain:
             return Action.GRAB_HP
         
         if Object.STENCH in perceptions:
-            return Action.SHOOT
+            return self.aim_at_wumpus()
 
-        safe_unvisited = self.safe_cells - self.visited_cells
-        if safe_unvisited:
-            return self.move_towards_safe(safe_unvisited)
+        if self.frontier:
+            return self.move_towards_safe(self.frontier)
 
-        if self.unknown_cells and self.has_gold == False:
+        if self.has_unknown_cells() and self.has_gold == False:
             return self.explore_unknown()
         elif self.has_gold:
             return self.return_to_start()
@@ -125,95 +251,127 @@ class AgentBrain:
 
         return self.backtrack()
 
-    def move_towards_safe(self, safe_cells: Set[Tuple[int, int]]) -> Action:
-        current_x, current_y = self.map.agent_position
-        for dx, dy in [(-1, 0), (0, 1), (1, 0), (0, -1)]:
-            target = (current_x + dx, current_y + dy)
-            if target in safe_cells and target not in self.last_positions:
-                return self.move_towards(target)
-
-        # If there is no safe cell around, move to the next safe cell
-        unvisited_safe = safe_cells - self.visited_cells
-        if unvisited_safe:
-            nearest_safe = min(unvisited_safe, key=lambda cell: self.manhattan_distance(self.map.agent_position, cell))
-            path = self.find_safe_path(self.map.agent_position, nearest_safe)
-            if path:
-                return self.move_towards(path[1])
-        
-        return self.move_towards(next(iter(safe_cells)))
+    def aim_at_wumpus(self) -> Action:
+        # The simulator fires ahead, then to the right, then to the left, but
+        # not at all when the agent faces the edge of the board. Turning away
+        # from the edge makes one volley cover every neighbour.
+        x, y = self.map.agent_position
+        dx, dy = DIRECTION_DELTAS[self.direction]
+        if self.map.is_valid_position(x + dx, y + dy):
+            return Action.SHOOT
+        return self.turn_to_direction(OPPOSITE[self.direction])
 
     def move_towards_safe(self, safe_cells: Set[Tuple[int, int]]) -> Action:
-        current_x, current_y = self.map.agent_position
-        for dx, dy in [(-1, 0), (0, 1), (1, 0), (0, -1)]:
-            target = (current_x + dx, current_y + dy)
+        for target in self.adjacency.clockwise_of(*self.map.agent_position):
             if target in safe_cells and target not in self.last_positions:
                 return self.move_towards(target)
 
         # If there is no safe cell around, move to the next safe cell
-        unvisited_safe = safe_cells - self.visited_cells
-        if unvisited_safe:
-            nearest_safe = min(unvisited_safe, key=lambda cell: self.manhattan_distance(self.map.agent_position, cell))
-            path = self.find_safe_path(self.map.agent_position, nearest_safe)
-            if path:
-                return self.move_towards(path[1])
+        nearest_safe = min(safe_cells, key=self.distance_order)
+        action = self.next_planned_action(nearest_safe)
+        if action is not None:
+            return action
+        path = self.find_safe_path(self.map.agent_position, nearest_safe)
+        if path:
+            return self.follow_path(path)
         
-        return self.move_towards(next(iter(safe_cells)))
+        return self.move_towards(nearest_safe)
 
     def find_safe_path(self, start: Tuple[int, int], goal: Tuple[int, int]) -> List[Tuple[int, int]]:
-        queue = deque([(start, [start])])
-        visited = set()
-
-        while queue:
-            (x, y), path = queue.popleft()
-            if (x, y) == goal:
-                return path
-
-            if (x, y) not in visited:
-                visited.add((x, y))
-                for dx, dy in [(-1, 0), (0, 1), (1, 0), (0, -1)]:
-                    next_cell = (x + dx, y + dy)
-                    if (next_cell in self.safe_cells and 
-                        next_cell not in visited and 
-                        0 <= next_cell[0] < self.map.size and 
-                        0 <= next_cell[1] < self.map.size):
-                        queue.append((next_cell, path + [next_cell]))
-
-        return []  # No path found
+        return self.planner.find_path(start, goal, self.safe_cells, self.direction)
+
+    def follow_path(self, path: List[Tuple[int, int]]) -> Action:
+        # Turn the whole route into actions once and execute them over the next ticks
+        self.action_plan = deque(plan_actions(path, self.direction))
+        self.plan_goal = path[-1]
+        return self.next_planned_action(self.plan_goal)
+
+    def next_planned_action(self, goal: Tuple[int, int]) -> Optional[Action]:
+        if not self.action_plan or goal != self.plan_goal:
+            return None
+
+        action, position, heading, next_heading = self.action_plan[0]
+        if position != self.map.agent_position or heading != self.direction:
+            self.action_plan.clear()
+            return None
+        if action == Action.MOVE_FORWARD:
+            dx, dy = DIRECTION_DELTAS[heading]
+            if (position[0] + dx, position[1] + dy) not in self.safe_cells:
+                self.action_plan.clear()
+                return None
+
+        self.action_plan.popleft()
+        self.direction = next_heading
+        return action
 
     def explore_unknown(self) -> Action:
-        current_x, current_y = self.map.agent_position
-        for dx, dy in [(-1, 0), (0, 1), (1, 0), (0, -1)]:
-            target = (current_x + dx, current_y + dy)
-            if target in self.unknown_cells and target not in self.dangerous_cells and target not in self.last_positions:
+        for target in self.adjacency.clockwise_of(*self.map.agent_position):
+            if target in self.unknown_boundary and target not in self.last_positions:
                 return self.move_towards(target)
+
+        # Step into the least risky undecided cell next to the explored area
+        if self.dangerous_cells:
+            risks = self.risk.risks(self.dangerous_cells)
+            target = min(risks, key=lambda cell: (risks[cell], self.manhattan_distance(self.map.agent_position, cell), -cell[0], -cell[1]))
+            action = self.approach(target)
+            if action is not None:
+                return action
         
-        safe_unknown = self.unknown_cells - self.dangerous_cells
-        if safe_unknown:
-            nearest_unknown = min(safe_unknown, key=lambda cell: self.manhattan_distance(self.map.agent_position, cell))
+        # The nearest unknown cell always borders a known one
+        if self.unknown_boundary:
+            nearest_unknown = min(self.unknown_boundary, key=self.exploration_priority)
             return self.move_towards(nearest_unknown)
         
         return self.backtrack()
 
+    def approach(self, target: Tuple[int, int]) -> Optional[Action]:
+        # Walk through visited cells to a neighbour of the target, then step in
+        if target in self.get_adjacent_cells(*self.map.agent_position):
+            return self.move_towards(target)
+
+        entries = [adj for adj in self.get_adjacent_cells(*target) if adj in self.visited_cells]
+        if not entries:
+            return None
+        entry = min(entries, key=lambda cell: self.manhattan_distance(self.map.agent_position, cell))
+        action = self.next_planned_action(entry)
+        if action is not None:
+            return action
+        path = self.find_safe_path(self.map.agent_position, entry)
+        if path:
+            return self.follow_path(path)
+        return None
+
+    def distance_order(self, cell: Tuple[int, int]) -> Tuple[int, int, int]:
+        # Ties are broken by position, never by set iteration order, so a
+        # restored snapshot makes the same choices as the original episode
+        return self.manhattan_distance(self.map.agent_position, cell), -cell[0], -cell[1]
+
+    def exploration_priority(self, cell: Tuple[int, int]) -> Tuple[int, int, int, int]:
+        # Nearest first, then the fewest suspected dangers around the cell. The
+        # last key keeps ties independent of set iteration order.
+        risk = sum(adj in self.dangerous_cells for adj in self.get_adjacent_cells(*cell))
+        return self.manhattan_distance(self.map.agent_position, cell), risk, -cell[0], -cell[1]
+
     def backtrack(self) -> Action:
         if not self.visited_cells:
             return Action.MOVE_FORWARD
 
-        target = min(self.visited_cells - set(self.last_positions), 
-                     key=lambda cell: self.manhattan_distance(self.map.agent_position, cell), 
-                     default=None)
+        target = min(self.visited_cells - set(self.last_positions), key=self.distance_order, default=None)
 
         if target is None:
-            target = max(self.visited_cells, 
-                         key=lambda cell: self.manhattan_distance(self.map.agent_position, cell))
+            target = max(self.visited_cells, key=self.distance_order)
             
         return self.move_towards(target)
     
     def return_to_start(self) -> Action:
         # Find path to start position
         start_position = (self.map.size - 1, 0)  # Pos (9, 0)
+        action = self.next_planned_action(start_position)
+        if action is not None:
+            return action
         path = self.find_safe_path(self.map.agent_position, start_position)
         if path:
-            return self.move_towards(path[1])
+            return self.follow_path(path)
     
     def move_towards(self, target: Tuple[int, int]) -> Action:
         dx = target[0] - self.map.agent_position[0]
@@ -238,64 +396,41 @@ class AgentBrain:
         if self.direction == target_direction:
             return Action.MOVE_FORWARD
         
-        turns = {
-            (Direction.UP, Direction.RIGHT): Action.TURN_RIGHT,
-            (Direction.UP, Direction.DOWN): Action.TURN_RIGHT,
-            (Direction.UP, Direction.LEFT): Action.TURN_LEFT,
-            (Direction.RIGHT, Direction.DOWN): Action.TURN_RIGHT,
-            (Direction.RIGHT, Direction.LEFT): Action.TURN_RIGHT,
-            (Direction.RIGHT, Direction.UP): Action.TURN_LEFT,
-            (Direction.DOWN, Direction.LEFT): Action.TURN_RIGHT,
-            (Direction.DOWN, Direction.UP): Action.TURN_RIGHT,
-            (Direction.DOWN, Direction.RIGHT): Action.TURN_LEFT,
-            (Direction.LEFT, Direction.UP): Action.TURN_RIGHT,
-            (Direction.LEFT, Direction.RIGHT): Action.TURN_RIGHT,
-            (Direction.LEFT, Direction.DOWN): Action.TURN_LEFT,
-        }
-        
-        turn_action = turns.get((self.direction, target_direction), Action.MOVE_FORWARD)
+        turn_action = TURN_ACTIONS.get((self.direction, target_direction), Action.MOVE_FORWARD)
         if turn_action != Action.MOVE_FORWARD:
             self.direction = target_direction
         return turn_action
 
     def process_successful_shot(self, wumpus_position: Tuple[int, int]):
         x, y = wumpus_position
-        cell_id = self.get_cell_id(x, y)
 
-        self.knowledge_base.add_clause([-cell_id[Object.WUMPUS]])
-        self.safe_cells.add(wumpus_position)
-        self.dangerous_cells.discard(wumpus_position)
-        self.unknown_cells.discard(wumpus_position)
+        self.add_clause([-self.get_cell_id(x, y, Object.WUMPUS)])
+        self.risk.remove(wumpus_position, Object.WUMPUS)
+        self.mark_safe(wumpus_position)
 
         adjacent_cells = self.map.get_adjacent_cells(x, y)
         for ax, ay in adjacent_cells:
-            adj_cell_id = self.get_cell_id(ax, ay)
-            self.knowledge_base.add_clause([-adj_cell_id[Object.STENCH]])
+            self.add_clause([-self.get_cell_id(ax, ay, Object.STENCH)])
 
             if (ax, ay) not in self.visited_cells and not self.is_dangerous(ax, ay):
-                self.safe_cells.add((ax, ay))
-                self.dangerous_cells.discard((ax, ay))
-                self.unknown_cells.discard((ax, ay))
+                self.mark_safe((ax, ay))
 
     def update_knowledge_after_grab(self, grabbed_object: Object, position: Tuple[int, int]):
         x, y = position
-        cell_id = self.get_cell_id(x, y)
 
         if grabbed_object == Object.GOLD:
-            self.knowledge_base.add_clause([-cell_id[Object.GOLD]])
+            self.add_clause([-self.get_cell_id(x, y, Object.GOLD)])
             self.has_gold = True
         elif grabbed_object == Object.HEALING_POTIONS:
-            self.knowledge_base.add_clause([-cell_id[Object.HEALING_POTIONS]])
+            self.add_clause([-self.get_cell_id(x, y, Object.HEALING_POTIONS)])
             
             # Remove GLOW from adjacent cells in the knowledge base
             adjacent_cells = self.get_adjacent_cells(x, y)
             for ax, ay in adjacent_cells:
-                adj_cell_id = self.get_cell_id(ax, ay)
-                self.knowledge_base.add_clause([-adj_cell_id[Object.GLOW]])
+                self.add_clause([-self.get_cell_id(ax, ay, Object.GLOW)])
 
         # Update safe cells and remove from unknown cells
-        self.safe_cells.add(position)
-        self.unknown_cells.discard(position)
+        self.mark_safe(position)
     
     def manhattan_distance(self, cell1: Tuple[int, int], cell2: Tuple[int, int]) -> int:
-        return abs(cell1[0] - cell2[0]) + abs(cell1[1] - cell2[1])
\ No newline at end of file
+        return manhattan_distance(cell1, cell2)
\ No newline at end of file
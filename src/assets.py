@@ -0,0 +1,36 @@
+import pygame
+from functools import lru_cache
+from typing import Dict, Tuple
+
+# Decoded images, shared by the whole process
+_images: Dict[str, pygame.Surface] = {}
+
+
+def load_image(path: str) -> pygame.Surface:
+    image = _images.get(path)
+    if image is None:
+        image = pygame.image.load(path).convert_alpha()
+        _images[path] = image
+    return image
+
+
+@lru_cache(maxsize=256)
+def load_scaled(path: str, size: int) -> pygame.Surface:
+    return pygame.transform.scale(load_image(path), (size, size))
+
+
+@lru_cache(maxsize=16)
+def load_atlas(paths: Tuple[str, ...], size: int) -> Dict[str, pygame.Surface]:
+    # Pack the scaled sprites side by side in one surface and hand out subsurfaces
+    atlas = pygame.Surface((size * len(paths), size), pygame.SRCALPHA).convert_alpha()
+    sprites = {}
+    for index, path in enumerate(paths):
+        atlas.blit(load_scaled(path, size), (index * size, 0))
+        sprites[path] = atlas.subsurface((index * size, 0, size, size))
+    return sprites
+
+
+def clear_cache():
+    _images.clear()
+    load_scaled.cache_clear()
+    load_atlas.cache_clear()
@@ -0,0 +1,220 @@
+import argparse
+import csv
+import glob
+import os
+import sys
+import time
+from multiprocessing import Pool
+from typing import List, Dict
+
+from utils import Object
+from program import Map
+from algorithm import AgentBrain
+from simulator import Simulator, MAX_STEPS
+from trajectory import TrajectoryWriter, TRAJECTORY_FORMATS, FORMAT_TEXT
+from replay import ReplayWriter, FORMAT_REPLAY
+from instrument import Metrics
+from solvers import SOLVER_BACKENDS, DEFAULT_SOLVER, SolverPool
+from mapgen import MapSpec, iter_specs, add_generator_arguments, densities_from_args
+from mapfile import ArchiveEntry, MapArchive, is_archive, PACKED_EXTENSION, ARCHIVE_EXTENSION
+
+MAP_BACKENDS = ["cells", "grid"]
+MAP_PATTERNS = ["*.txt", f"*{PACKED_EXTENSION}", f"*{ARCHIVE_EXTENSION}"]
+
+# One pool per solver backend in each worker process
+solver_pools: Dict[str, SolverPool] = {}
+# Archives stay open in each worker process so every map is a seek away
+archives: Dict[str, MapArchive] = {}
+
+SUMMARY_FIELDS = ["map", "score", "health", "steps", "outcome", "wall_time", "solver_calls", "cache_hits", "cache_misses", "local_answers",
+                  "clauses", "variables"]
+METRIC_LABELS = ["sat.solve", "kb.add_clause", "brain.find_safe_path", "brain.update_knowledge", "think"]
+METRIC_FIELDS = [f"{label}_ms" for label in METRIC_LABELS]
+
+
+def collect_maps(sources: List[str]) -> List:
+    # Each source is a map file, an archive, a directory of maps or a glob pattern.
+    # archive.wwa:K picks map K of an archive and archive.wwa:START:STOP a range.
+    # Raises ValueError for a selection that does not fit its archive.
+    map_files = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths = sorted(path for pattern in MAP_PATTERNS for path in glob.glob(os.path.join(source, pattern)))
+        elif os.path.isfile(source):
+            paths = [source]
+        elif os.path.isfile(source.split(":")[0]):
+            path, selection = source.split(":", 1)
+            if not is_archive(path):
+                raise ValueError(f"{path} is not a map archive, only archives take a map selection")
+            map_files.extend(archive_entries(path, selection))
+            continue
+        else:
+            paths = sorted(glob.glob(source, recursive=True))
+        for path in paths:
+            map_files.extend(archive_entries(path) if is_archive(path) else [path])
+    return map_files
+
+
+def archive_entries(path: str, selection: str = None) -> List[ArchiveEntry]:
+    # Only the index is read, the maps are loaded by the workers
+    archive = MapArchive(path)
+    try:
+        count = len(archive)
+        if selection is None:
+            indices = range(count)
+        else:
+            try:
+                bounds = [int(index) for index in selection.split(":")]
+                if len(bounds) > 2:
+                    raise ValueError(selection)
+            except ValueError:
+                raise ValueError(f"Invalid map selection {path}:{selection}, expected K or START:STOP")
+            if len(bounds) == 1 and 0 <= bounds[0] < count:
+                indices = range(bounds[0], bounds[0] + 1)
+            elif len(bounds) == 2 and 0 <= bounds[0] < bounds[1] <= count:
+                indices = range(*bounds)
+            else:
+                raise ValueError(f"Invalid map selection {path}:{selection}, the archive holds maps 0 to {count - 1}")
+        return [ArchiveEntry(path, index, archive.name(index)) for index in indices]
+    finally:
+        archive.close()
+
+
+def trajectory_path(map_file: str, trajectory_dir: str, trajectory_format: str) -> str:
+    name = os.path.splitext(os.path.basename(map_file))[0]
+    extension = "txt" if trajectory_format == FORMAT_TEXT else trajectory_format
+    return os.path.join(trajectory_dir, f"{name}.{extension}")
+
+
+def new_map(backend: str) -> Map:
+    if backend == "grid":
+        from grid import GridMap
+        return GridMap()
+    return Map()
+
+
+def run_map(map_file, max_steps: int = MAX_STEPS, trajectory_dir: str = None,
+            trajectory_format: str = FORMAT_TEXT, backend: str = "cells", metrics: bool = False,
+            trace_dir: str = None, solver: str = DEFAULT_SOLVER) -> Dict:
+    start_time = time.perf_counter()
+
+    map = new_map(backend)
+    priors = None
+    if isinstance(map_file, MapSpec):
+        # Generated maps never touch the disk, and their densities are the agent's priors
+        map.load_text(map_file.generate())
+        priors = {Object.PIT: map_file.pit_density, Object.WUMPUS: map_file.wumpus_density,
+                  Object.POISONOUS_GAS: map_file.gas_density}
+        map_file = map_file.name
+    elif isinstance(map_file, ArchiveEntry):
+        if map_file.path not in archives:
+            archives[map_file.path] = MapArchive(map_file.path)
+        map.load_object_bits(*archives[map_file.path].bits(map_file.index))
+        map_file = map_file.name
+    else:
+        map.load_map(map_file)
+    pool = solver_pools.setdefault(solver, SolverPool(solver))
+    brain = AgentBrain(map, pool.acquire(), priors)
+    simulator = Simulator(map, brain, max_steps=max_steps)
+    if trajectory_dir is not None:
+        path = trajectory_path(map_file, trajectory_dir, trajectory_format)
+        if trajectory_format == FORMAT_REPLAY:
+            simulator.add_observer(ReplayWriter(path, map))
+        else:
+            simulator.add_observer(TrajectoryWriter(path, trajectory_format))
+
+    episode_metrics = None
+    if metrics or trace_dir is not None:
+        episode_metrics = Metrics(trace=trace_dir is not None)
+        episode_metrics.attach_brain(brain)
+    try:
+        outcome = simulator.run()
+    finally:
+        pool.release(brain.knowledge_base.solver)
+
+    row = {
+        "map": map_file,
+        "score": simulator.score,
+        "health": simulator.health,
+        "steps": simulator.steps,
+        "outcome": outcome,
+        "wall_time": round(time.perf_counter() - start_time, 6),
+        "solver_calls": brain.solver_calls,
+        "cache_hits": brain.cache_hits,
+        "cache_misses": brain.cache_misses,
+        "local_answers": brain.local_answers,
+        "clauses": brain.knowledge_base.num_clauses(),
+        "variables": brain.knowledge_base.num_variables(),
+    }
+    if episode_metrics is not None:
+        summary = episode_metrics.summary()
+        for label, field in zip(METRIC_LABELS, METRIC_FIELDS):
+            row[field] = round(summary[label]["total_ms"], 3)
+        if trace_dir is not None:
+            name = os.path.splitext(os.path.basename(map_file))[0]
+            episode_metrics.dump_chrome_trace(os.path.join(trace_dir, f"{name}.trace.json"))
+    return row
+
+
+def _run_map_args(args):
+    map_file, options = args
+    return run_map(map_file, **options)
+
+
+def run_batch(map_files: List, workers: int = None, **options):
+    # options are passed on to run_map for every map
+    tasks = [(map_file, options) for map_file in map_files]
+    if workers == 1:
+        yield from map(_run_map_args, tasks)
+        return
+
+    # Hand out maps in small chunks to keep IPC overhead low on large corpora
+    chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 8))
+    with Pool(processes=workers) as pool:
+        yield from pool.imap(_run_map_args, tasks, chunksize=chunksize)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the agent on many maps in parallel")
+    parser.add_argument("maps", nargs="*", help="map files, archives, directories or glob patterns")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("-o", "--output", default=None, help="CSV summary file (default: stdout)")
+    parser.add_argument("--max-steps", type=int, default=MAX_STEPS, help="step limit per episode")
+    parser.add_argument("--trajectories", default=None, help="directory to write one trajectory per map")
+    parser.add_argument("--trajectory-format", choices=TRAJECTORY_FORMATS + [FORMAT_REPLAY], default=FORMAT_TEXT)
+    parser.add_argument("--backend", choices=MAP_BACKENDS, default="cells", help="map representation (grid needs numpy)")
+    parser.add_argument("--solver", choices=list(SOLVER_BACKENDS), default=DEFAULT_SOLVER, help="SAT solver backend")
+    parser.add_argument("--metrics", action="store_true", help="add solver, planner and decision timings to the summary")
+    parser.add_argument("--traces", default=None, help="directory to write one Chrome trace per map")
+    parser.add_argument("--generate", type=int, default=0, metavar="COUNT", help="also run COUNT generated maps")
+    add_generator_arguments(parser)
+    args = parser.parse_args(argv)
+
+    try:
+        map_files = collect_maps(args.maps)
+    except ValueError as error:
+        parser.error(str(error))
+    map_files.extend(iter_specs(args.generate, args.size, args.seed, *densities_from_args(args)))
+    if not map_files:
+        parser.error("no map files found")
+    for directory in [args.trajectories, args.traces]:
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+    metrics = args.metrics or args.traces is not None
+
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        writer = csv.DictWriter(output, fieldnames=SUMMARY_FIELDS + (METRIC_FIELDS if metrics else []))
+        writer.writeheader()
+        rows = run_batch(map_files, args.workers, max_steps=args.max_steps, trajectory_dir=args.trajectories,
+                         trajectory_format=args.trajectory_format, backend=args.backend, metrics=metrics,
+                         trace_dir=args.traces, solver=args.solver)
+        for row in rows:
+            writer.writerow(row)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
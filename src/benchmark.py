@@ -0,0 +1,197 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from program import Map
+from algorithm import AgentBrain
+from simulator import Simulator
+from mapgen import MapSpec
+
+SIZES = [10, 25, 50]
+DENSITIES = {
+    "low": (0.05, 0.02, 0.02, 0.02, 0.05),
+    "high": (0.15, 0.08, 0.05, 0.02, 0.05),
+}
+MAPS_PER_CONFIG = 3
+PATH_QUERIES = 50
+MAX_STEPS = 2000
+
+# Metrics where a larger value is a regression, and those where a smaller one is
+LOWER_IS_BETTER = ["load_ms", "decision_p50_ms", "decision_p95_ms", "decision_p99_ms", "path_p50_ms", "sat_calls_per_step"]
+HIGHER_IS_BETTER = ["steps_per_second"]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    # Nearest-rank percentile
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    # High-water mark of the whole process, so each configuration runs in a
+    # fresh one. ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def time_load(map_text: str) -> float:
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write(map_text)
+        path = f.name
+    try:
+        start = time.perf_counter()
+        Map().load_map(path)
+        return time.perf_counter() - start
+    finally:
+        os.remove(path)
+
+
+def run_episode(map_text: str, max_steps: int) -> Dict:
+    map = Map()
+    map.load_text(map_text)
+    brain = AgentBrain(map)
+    simulator = Simulator(map, brain, max_steps=max_steps)
+
+    # Time every decision of the brain
+    decisions = []
+    make_decision = brain.make_decision
+
+    def timed_decision(perceptions):
+        start = time.perf_counter()
+        action = make_decision(perceptions)
+        decisions.append(time.perf_counter() - start)
+        return action
+
+    brain.make_decision = timed_decision
+    start = time.perf_counter()
+    simulator.run()
+    elapsed = time.perf_counter() - start
+
+    return {"brain": brain, "decisions": decisions, "elapsed": elapsed, "steps": simulator.steps}
+
+
+def time_paths(brain: AgentBrain, seed: int, queries: int) -> List[float]:
+    rng = random.Random(seed)
+    safe_cells = sorted(brain.safe_cells)
+    if len(safe_cells) < 2:
+        return []
+
+    timings = []
+    for _ in range(queries):
+        start_cell, goal = rng.sample(safe_cells, 2)
+        brain.planner.invalidate()
+        start = time.perf_counter()
+        brain.find_safe_path(start_cell, goal)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run_config(size: int, density_name: str, maps: int, seed: int, max_steps: int) -> Dict:
+    loads, decisions, paths = [], [], []
+    steps = 0
+    elapsed = 0.0
+    solver_calls = 0
+
+    for index in range(maps):
+        spec = MapSpec(size, seed + index, *DENSITIES[density_name])
+        map_text = spec.generate()
+        loads.append(time_load(map_text))
+
+        episode = run_episode(map_text, max_steps)
+        decisions.extend(episode["decisions"])
+        steps += episode["steps"]
+        elapsed += episode["elapsed"]
+        solver_calls += episode["brain"].solver_calls
+        paths.extend(time_paths(episode["brain"], seed + index, PATH_QUERIES))
+        episode["brain"].close()
+
+    return {
+        "size": size,
+        "density": density_name,
+        "maps": maps,
+        "steps": steps,
+        "load_ms": 1000 * sum(loads) / len(loads),
+        "decision_p50_ms": 1000 * percentile(decisions, 0.50),
+        "decision_p95_ms": 1000 * percentile(decisions, 0.95),
+        "decision_p99_ms": 1000 * percentile(decisions, 0.99),
+        "path_p50_ms": 1000 * percentile(paths, 0.50),
+        "steps_per_second": steps / elapsed if elapsed else 0.0,
+        "sat_calls_per_step": solver_calls / steps if steps else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(results: List[Dict], baseline: List[Dict], threshold: float) -> List[str]:
+    # Relative change beyond the threshold in the wrong direction is a regression
+    regressions = []
+    baseline_by_key = {(row["size"], row["density"]): row for row in baseline}
+    for row in results:
+        old = baseline_by_key.get((row["size"], row["density"]))
+        if old is None:
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            before, after = old.get(metric), row.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if metric in HIGHER_IS_BETTER:
+                change = -change
+            if change > threshold:
+                regressions.append(f"{row['size']}x{row['size']}/{row['density']} {metric}: {before:.4g} -> {after:.4g}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark AgentBrain decisions, path planning, map loading and episodes")
+    parser.add_argument("-o", "--output", default=None, help="JSON file for the results")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--densities", nargs="+", choices=list(DENSITIES), default=list(DENSITIES))
+    parser.add_argument("--maps", type=int, default=MAPS_PER_CONFIG, help="maps per size and density")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-steps", type=int, default=MAX_STEPS)
+    parser.add_argument("--compare", default=None, help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown before failing")
+    args = parser.parse_args(argv)
+
+    # Spawned rather than forked, so no configuration starts from the memory of earlier ones
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for size in args.sizes:
+        for density_name in args.densities:
+            with context.Pool(1) as pool:
+                row = pool.apply(run_config, (size, density_name, args.maps, args.seed, args.max_steps))
+            results.append(row)
+            print(f"{size}x{size} {density_name}: decision p50/p95/p99 "
+                  f"{row['decision_p50_ms']:.3f}/{row['decision_p95_ms']:.3f}/{row['decision_p99_ms']:.3f} ms, "
+                  f"{row['steps_per_second']:.0f} steps/s, {row['sat_calls_per_step']:.2f} SAT calls/step, "
+                  f"load {row['load_ms']:.2f} ms, peak RSS {row['peak_rss_mb']:.1f} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("REGRESSIONS:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,30 @@
+import os
 import pygame
 from program import *
 from agent import Agent
 from algorithm import AgentBrain
+from simulator import Simulator, UndoHistory
+from trajectory import TrajectoryWriter
+from replay import ReplayWriter, ReplayReader, ReplayCursor
+from renderer import BoardRenderer, INFO_WIDTH
+from assets import load_atlas
+from timeline import Timeline, FixedStepper
+from instrument import Metrics
+
+BOARD_IMAGES = {
+    'undiscovered': IMG_UNDISCOVERED_CELL,
+    'discovered': IMG_DISCOVERED_CELL,
+    'pit': IMG_PIT,
+    'gold': IMG_GOLD,
+    'wumpus': IMG_WUMPUS,
+    'poisonous_gas': IMG_POISONOUS_GAS,
+    'healing_potions': IMG_HEALING_POTIONS,
+    'breeze': IMG_BREEZE,
+    'glow': IMG_GLOW,
+    'stench': IMG_STENCH,
+    'whiff': IMG_WHIFF,
+    'scream': IMG_SCREAM,
+}
 
 class Button:
     def __init__(self, x, y, width, height, text, color, text_color, font):
@@ -21,7 +44,9 @@ class Button:
         return self.rect.collidepoint(pos)
 
 class Game:
-    def __init__(self):
+    def __init__(self, trace_path: str = None, record_path: str = None):
+        self.trace_path = trace_path
+        self.record_path = record_path
         pygame.init()
         pygame.font.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
@@ -36,7 +61,15 @@ class Game:
         self.map_type = 0
         self.map = None
         self.agent = None
-        self.agent_brain = None
+        self.simulator = None
+        self.trajectory = None
+        self.recording = None
+        self.renderer = None
+        self.timeline = None
+        self.turbo = False
+        self.stepper = None
+        self.metrics = None
+        self.history = None
 
     def main_menu(self):
         title = self.title_font.render(CAPTION, True, BLUE)
@@ -146,220 +179,154 @@ class Game:
         # Initialize map and agent
         self.map = Map()
         self.map.load_map(MAP_LIST[self.map_type])
-        self.agent = Agent(self.map)
-        self.agent_brain = AgentBrain(self.map)
-        
-        first_cell = self.map.get_cell(*self.map.agent_position)
-        first_cell.discover()
-        first_cell.mark_visited()
+        self.simulator = Simulator(self.map, AgentBrain(self.map))
+        self.trajectory = TrajectoryWriter(OUTPUT_LIST[self.map_type])
 
         # Calculate cell size
         cell_size = SCREEN_HEIGHT // self.map.size
+        self.timeline = Timeline(turbo=self.turbo)
+        self.agent = Agent(self.map, self.simulator.brain, cell_size, self.timeline)
+
+        # The GUI only observes the simulation
+        self.simulator.add_observer(self.agent)
+        self.simulator.add_observer(self.trajectory)
+        if self.record_path is not None:
+            self.recording = ReplayWriter(self.record_path, self.map)
+            self.simulator.add_observer(self.recording)
         
         # Load images
         images = self.load_images(cell_size)
+
+        self.renderer = BoardRenderer(self.screen, self.map, self.simulator, self.agent, images,
+                                      cell_size, self.text_font, self.map_type + 1, self.timeline)
+        self.simulator.add_observer(self.renderer)
+
+        # Time the think, draw and write phases of each episode when tracing
+        if self.trace_path is not None:
+            self.metrics = Metrics(trace=True)
+            self.metrics.attach_brain(self.simulator.brain)
+            self.metrics.attach_game(self.renderer, self.trajectory)
         
-        game_over = False
-        while not game_over:
+        self.stepper = FixedStepper()
+        self.history = UndoHistory(self.simulator)
+        elapsed = 0
+        while not self.simulator.game_over:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                    self.trajectory.close()
+                    if self.recording is not None:
+                        self.recording.close()
+                    self.simulator.brain.close()
                     return "QUIT"
+                if event.type == pygame.KEYDOWN:
+                    self.handle_play_key(event.key)
 
-            if not game_over:
-                # Get agent's perceptions
-                last_position = self.map.agent_position
-                current_cell = self.map.get_cell(*self.map.agent_position)
-                perceptions = self.agent.perceive(current_cell)
-                
-                # Agent makes a decision
-                action = self.agent.act(perceptions)
-                self.write_output(f"output/output{self.map_type + 1}.txt", action, last_position, self.agent)
-
-                # Update game state based on action
-                if action == Action.MOVE_FORWARD:
-                    new_cell = self.map.get_cell(*self.map.agent_position)
-                        
-                    # Check for game over conditions
-                    if Object.WUMPUS in new_cell.contents or Object.PIT in new_cell.contents:
-                        self.agent.die()
-                        game_over = True
-                    elif Object.GOLD in new_cell.contents:
-                        self.agent.brain.has_gold = True
-                        new_cell.remove_content(Object.GOLD)
-                    elif Object.POISONOUS_GAS in new_cell.contents:
-                        self.agent.health = max(0, self.agent.health - 25)
-                        if self.agent.health == 0:
-                            self.agent.die()
-                            game_over = True
-                    elif Object.HEALING_POTIONS in new_cell.contents:
-                        pass
-
-                elif action in [Action.TURN_LEFT, Action.TURN_RIGHT]:
-                    self.agent.update_position(action)
-
-                elif action == Action.SHOOT:
-                    pass
-                
-                elif action == Action.GRAB_G:
-                    current_cell.remove_content(Object.GOLD)
-                    self.agent.brain.has_gold = True
-
-                elif action == Action.GRAB_HP:
-                    self.agent.health = min(100, self.agent.health + 25)
-
-                # Check if agent wants to climb out
-                if self.map.agent_position == (9, 0) and self.agent.brain.has_gold:
-                    action = Action.CLIMB
-                    game_over = True
-
-            self.draw_game(images, cell_size, self.agent, self.map)
-            pygame.display.flip()
-            self.clock.tick(FPS)
+            # Run as many fixed simulation steps as are due, then render once
+            for _ in range(self.stepper.steps_due(elapsed)):
+                if self.simulator.game_over:
+                    break
+                self.history.record()
+                self.simulator.step()
 
-        # Game over, display final score
-        self.write_output(f"output/output{self.map_type + 1}.txt", action, self.map.agent_position, self.agent, game_over=True)
-        self.display_game_over()
+            # Only push the parts of the screen that changed
+            self.renderer.status = self.stepper.status()
+            pygame.display.update(self.renderer.draw(pygame.time.get_ticks()))
+            elapsed = self.clock.tick(RENDER_FPS)
 
-    def load_images(self, cell_size):
-        images = {
-            'undiscovered': pygame.image.load(IMG_UNDISCOVERED_CELL).convert_alpha(),
-            'discovered': pygame.image.load(IMG_DISCOVERED_CELL).convert_alpha(),
-            'pit': pygame.image.load(IMG_PIT).convert_alpha(),
-            'gold': pygame.image.load(IMG_GOLD).convert_alpha(),
-            'wumpus': pygame.image.load(IMG_WUMPUS).convert_alpha(),
-            'poisonous_gas': pygame.image.load(IMG_POISONOUS_GAS).convert_alpha(),
-            'healing_potions': pygame.image.load(IMG_HEALING_POTIONS).convert_alpha(),
-            'breeze': pygame.image.load(IMG_BREEZE).convert_alpha(),
-            'glow': pygame.image.load(IMG_GLOW).convert_alpha(),
-            'stench': pygame.image.load(IMG_STENCH).convert_alpha(),
-            'whiff': pygame.image.load(IMG_WHIFF).convert_alpha(),
-            'scream': pygame.image.load(IMG_SCREAM).convert_alpha(),
-        }
-        
-        # Resize images
-        for key in images:
-            images[key] = pygame.transform.scale(images[key], (cell_size, cell_size))
-        
-        return images
-
-    def draw_game(self, images, cell_size, agent, map):
-        self.screen.fill(WHITE)
-
-        # Draw grid
-        for row in range(self.map.size):
-            for col in range(self.map.size):
-                cell = self.map.grid[row][col]
-                x = col * cell_size
-                y = row * cell_size
-
-                # Draw base cell
-                if cell.cell_type == CellType.UNDISCOVERED:
-                    self.screen.blit(images['undiscovered'], (x, y))
-                else:
-                    self.screen.blit(images['discovered'], (x, y))
-                
-                    # Draw cell contents
-                    if Object.PIT in cell.contents:
-                        self.screen.blit(images['pit'], (x, y))
-                    elif Object.GOLD in cell.contents:
-                        self.screen.blit(images['gold'], (x, y))
-                    elif Object.WUMPUS in cell.contents:
-                        self.screen.blit(images['wumpus'], (x, y))
-                    elif Object.POISONOUS_GAS in cell.contents:
-                        self.screen.blit(images['poisonous_gas'], (x, y))
-                    elif Object.HEALING_POTIONS in cell.contents:
-                        self.screen.blit(images['healing_potions'], (x, y))
-                    
-                    # Draw perceptions
-                    else:
-                        if Object.BREEZE in cell.contents:
-                            self.screen.blit(images['breeze'], (x, y))
-                        if Object.GLOW in cell.contents:
-                            self.screen.blit(images['glow'], (x, y))
-                        if Object.STENCH in cell.contents:
-                            self.screen.blit(images['stench'], (x, y))
-                        if Object.WHIFF in cell.contents:
-                            self.screen.blit(images['whiff'], (x, y))
-                        if Object.SCREAM in cell.contents:
-                            self.screen.blit(images['scream'], (x, y))
-                
-                # Draw agent
-                if map.agent_position == (row, col):
-                    self.screen.blit(agent.image, (x, y))
-
-        # Draw grid lines
-        for i in range(self.map.size):
-            pygame.draw.line(self.screen, BLACK, (0, i * cell_size), (SCREEN_HEIGHT, i * cell_size))
-            pygame.draw.line(self.screen, BLACK, (i * cell_size, 0), (i * cell_size, SCREEN_HEIGHT))
-        
-        # Draw information board
-        self.draw_info_board()
+        self.simulator.brain.close()
+        if self.metrics is not None:
+            self.metrics.dump_chrome_trace(self.trace_path)
 
-    def draw_info_board(self):
-        info_surface = pygame.Surface((SCREEN_WIDTH - SCREEN_HEIGHT, SCREEN_HEIGHT))
-        info_surface.fill(LIGHT_GRAY)
-        
-        # Add game information
-        title = self.text_font.render("GAME INFO", True, BLACK)
-        info_surface.blit(title, ((SCREEN_WIDTH - SCREEN_HEIGHT - title.get_width()) // 2, 50))
-        map_info = self.text_font.render(f"MAP: {self.map_type + 1}", True, BLACK)
-        info_surface.blit(map_info, ((SCREEN_WIDTH - SCREEN_HEIGHT - map_info.get_width()) // 2, 150))
-        score_info = self.text_font.render(f"SCORE: {self.agent.score}", True, BLACK)
-        info_surface.blit(score_info, ((SCREEN_WIDTH - SCREEN_HEIGHT - score_info.get_width()) // 2, 200))
-        health_info = self.text_font.render(f"HEALTH: {self.agent.health}", True, BLACK)
-        info_surface.blit(health_info, ((SCREEN_WIDTH - SCREEN_HEIGHT - health_info.get_width()) // 2, 250))
-        
-        self.screen.blit(info_surface, (SCREEN_HEIGHT, 0))
-        
-        # If agent has gold, display it
-        if self.agent.has_announce_gold:
-            gold_image = self.agent.img_announce_gold
-            gold_rect = gold_image.get_rect(center=((SCREEN_WIDTH + SCREEN_HEIGHT) // 2, SCREEN_HEIGHT - gold_image.get_height() // 2))
-            self.screen.blit(gold_image, gold_rect)
+        # Game over, display final score
+        self.display_game_over()
 
-            pygame.display.flip()
-            pygame.time.wait(2000)
-            self.agent.has_announce_gold = False
-        
-        # If wumpus is killed, display it
-        if self.agent.has_announce_wumpus:
-            wumpus_image = self.agent.img_announce_wumpus
-            wumpus_rect = wumpus_image.get_rect(center=((SCREEN_WIDTH + SCREEN_HEIGHT) // 2, SCREEN_HEIGHT - wumpus_image.get_height() // 2))
-            self.screen.blit(wumpus_image, wumpus_rect)
+    def handle_play_key(self, key):
+        if key == pygame.K_SPACE:
+            self.stepper.toggle_pause()
+        elif key == pygame.K_n:
+            self.stepper.single_step()
+        elif key == pygame.K_f:
+            self.stepper.faster()
+        elif key == pygame.K_s:
+            self.stepper.slower()
+        elif key == pygame.K_u and self.history.can_undo():
+            # Undo pauses the game so the restored step can be inspected
+            if not self.stepper.paused:
+                self.stepper.toggle_pause()
+            self.history.undo()
+        elif key == pygame.K_t:
+            # Turbo mode drops the arrow, scream and banner overlays
+            self.turbo = not self.turbo
+            for rect in self.timeline.set_turbo(self.turbo):
+                self.renderer.mark_rect_dirty(rect)
+
+    def replay_game(self, replay_path: str):
+        # Replays are read back from the file, neither the agent nor the solver runs
+        reader = ReplayReader(replay_path)
+        cursor = ReplayCursor(reader)
+
+        cell_size = SCREEN_HEIGHT // reader.map.size
+        self.timeline = Timeline(turbo=True)
+        self.agent = Agent(reader.map, None, cell_size, self.timeline)
+        images = self.load_images(cell_size)
+        self.renderer = BoardRenderer(self.screen, reader.map, cursor, self.agent, images, cell_size,
+                                      self.text_font, os.path.basename(replay_path), self.timeline)
 
-            pygame.display.flip()
-            pygame.time.wait(2000)
-            self.agent.has_announce_wumpus = False
+        self.stepper = FixedStepper()
+        self.stepper.toggle_pause()
+        elapsed = 0
+        while True:
+            target = cursor.step
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                    reader.close()
+                    return "QUIT"
+                if event.type == pygame.KEYDOWN:
+                    target = self.replay_target(event.key, target, len(reader))
+                dragging = event.type == pygame.MOUSEMOTION and event.buttons[0]
+                if dragging or (event.type == pygame.MOUSEBUTTONDOWN and event.button == 1):
+                    # Dragging across the info board scrubs through the whole episode
+                    x = event.pos[0] - SCREEN_HEIGHT
+                    if x >= 0:
+                        target = round(x / (INFO_WIDTH - 1) * len(reader))
+
+            target += self.stepper.steps_due(elapsed)
+            if target != cursor.step:
+                cursor.seek(target)
+                self.agent.image = self.agent.image_list[cursor.heading]
+                self.renderer.mark_all_dirty()
+                if cursor.step == len(reader) and not self.stepper.paused:
+                    self.stepper.toggle_pause()
+
+            self.renderer.status = f"STEP {cursor.step}/{len(reader)}"
+            pygame.display.update(self.renderer.draw(pygame.time.get_ticks()))
+            elapsed = self.clock.tick(RENDER_FPS)
+
+    def replay_target(self, key, step: int, steps: int) -> int:
+        if key == pygame.K_SPACE:
+            self.stepper.toggle_pause()
+        elif key == pygame.K_f:
+            self.stepper.faster()
+        elif key == pygame.K_s:
+            self.stepper.slower()
+        elif key == pygame.K_RIGHT:
+            return step + 1
+        elif key == pygame.K_LEFT:
+            return step - 1
+        elif key == pygame.K_PAGEUP:
+            return step + REPLAY_JUMP
+        elif key == pygame.K_PAGEDOWN:
+            return step - REPLAY_JUMP
+        elif key == pygame.K_HOME:
+            return 0
+        elif key == pygame.K_END:
+            return steps
+        return step
 
-    def write_output(self, output_file: str, action: Action, position: Tuple[int, int], agent: Agent, game_over: bool = False):
-        x, y = position
-        transformed_position = (self.map.size - x, y + 1)
-        
-        action_str = {
-            Action.MOVE_FORWARD: "Move forward",
-            Action.TURN_LEFT: "Turn left",
-            Action.TURN_RIGHT: "Turn right",
-            Action.SHOOT: "Shoot",
-            Action.GRAB_G: "Grab gold",
-            Action.GRAB_HP: "Grab health potion",
-            Action.CLIMB: "Climb"
-        }.get(action, "Unknown action")
-
-        with open(output_file, "a") as f:
-            f.write(f"{transformed_position}: {action_str}\n")
-
-        # If the action is CLIMB, we assume the game has ended and we write the final score and health
-        if game_over and action == Action.CLIMB:
-            with open(output_file, "a") as f:
-                f.write("------------------------------\n")
-                f.write(f"SCORE: {agent.score}\n")
-                f.write(f"HEALTH: {agent.health}\n")
-        elif game_over:
-            with open(output_file, "a") as f:
-                f.write(f"Agent die in Wumpus World\n")
-                f.write("------------------------------\n")
-                f.write(f"SCORE: {agent.score}\n")
-                f.write(f"HEALTH: {agent.health}\n")
+    def load_images(self, cell_size):
+        # Sprites are decoded once per process and scaled once per cell size
+        sprites = load_atlas(tuple(BOARD_IMAGES.values()), cell_size)
+        return {key: sprites[path] for key, path in BOARD_IMAGES.items()}
 
     def display_game_over(self):
         game_over_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
@@ -371,7 +338,7 @@ class Game:
         game_over_rect = game_over_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 50))
         self.screen.blit(game_over_text, game_over_rect)
 
-        score_text = self.text_font.render(f"Final Score: {self.agent.score}", True, WHITE)
+        score_text = self.text_font.render(f"Final Score: {self.simulator.score}", True, WHITE)
         score_rect = score_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 50))
         self.screen.blit(score_text, score_rect)
 
@@ -385,7 +352,12 @@ class Game:
                 if event.type == pygame.MOUSEBUTTONDOWN or event.type == pygame.KEYDOWN:
                     waiting = False
 
-    def run(self):
+    def run(self, replay_path: str = None):
+        if replay_path is not None:
+            self.replay_game(replay_path)
+            pygame.quit()
+            return
+
         while True:
             action = self.main_menu()
             if action == "QUIT":
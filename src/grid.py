@@ -0,0 +1,138 @@
+import numpy as np
+from utils import *
+from program import Map, MapState
+from adjacency import adjacency
+from mapfile import PLACED_BITS, PERCEPTION_SOURCES, text_to_bits
+from typing import Optional, Tuple, Set
+
+ALL_BITS = 0xFFFF
+
+
+def share_array_rows(array: np.ndarray, previous: Optional[Tuple[np.ndarray, ...]]) -> Tuple[np.ndarray, ...]:
+    # Like program.share_rows: rows equal to the previous snapshot's are shared
+    # with it, and only the rows that changed are copied
+    if previous is None or len(previous) != len(array):
+        return tuple(row.copy() for row in array)
+    return tuple(old if np.array_equal(old, new) else new.copy() for new, old in zip(array, previous))
+
+
+class GridCell:
+    # Thin view over one square of a GridMap, with the same API as Cell
+    __slots__ = ("map", "x", "y")
+
+    def __init__(self, map: "GridMap", x: int, y: int):
+        self.map = map
+        self.x = x
+        self.y = y
+
+    @property
+    def position(self) -> Tuple[int, int]:
+        return (self.x, self.y)
+
+    @property
+    def cell_type(self) -> CellType:
+        return CellType.DISCOVERED if self.map.discovered[self.x, self.y] else CellType.UNDISCOVERED
+
+    @property
+    def is_visited(self) -> bool:
+        return bool(self.map.visited[self.x, self.y])
+
+    @property
+    def contents(self) -> Set[Object]:
+        bits = int(self.map.bits[self.x, self.y])
+        return {obj for obj, bit in OBJECT_BITS.items() if bits & bit}
+
+    def discover(self):
+        self.map.discovered[self.x, self.y] = True
+
+    def add_content(self, content: Object):
+        if content in Object:
+            self.map.bits[self.x, self.y] |= OBJECT_BITS[content]
+        else:
+            raise ValueError(f"Invalid content: {content}")
+
+    def remove_content(self, content: Object):
+        self.map.bits[self.x, self.y] &= ALL_BITS ^ OBJECT_BITS[content]
+
+    def has_content(self, content: Object) -> bool:
+        return bool(self.map.bits[self.x, self.y] & OBJECT_BITS[content])
+
+    def mark_visited(self):
+        self.map.visited[self.x, self.y] = True
+
+    def is_dangerous(self):
+        return bool(self.map.bits[self.x, self.y] & DANGER_BITS)
+
+    def is_safe(self):
+        return not self.is_dangerous() and self.cell_type == CellType.DISCOVERED
+
+
+class GridMap(Map):
+    # Map backed by NumPy arrays: one uint16 bitmask of objects per square
+    def __init__(self):
+        super().__init__()
+        self.bits = np.zeros((0, 0), dtype=np.uint16)
+        self.discovered = np.zeros((0, 0), dtype=bool)
+        self.visited = np.zeros((0, 0), dtype=bool)
+
+    def read_map(self, f):
+        self.load_object_bits(*text_to_bits(f.read()))
+
+    def load_object_bits(self, size: int, bits):
+        self.load_bits(np.frombuffer(bits, dtype=np.uint16).reshape(size, size) & PLACED_BITS)
+
+    def load_bits(self, bits: np.ndarray):
+        self.size = bits.shape[0]
+        self.adjacency = adjacency(self.size)
+        self.last_state = None
+        self.bits = bits.astype(np.uint16)
+        self.discovered = np.zeros(bits.shape, dtype=bool)
+        self.visited = np.zeros(bits.shape, dtype=bool)
+
+        agent = np.argwhere(self.bits & OBJECT_BITS[Object.AGENT])
+        self.agent_position = tuple(int(v) for v in agent[-1]) if len(agent) else None
+        self.gold_positions = self.positions_of(Object.GOLD)
+        self.healing_positions = self.positions_of(Object.HEALING_POTIONS)
+
+        self._add_perceptions()
+
+    def snapshot(self) -> MapState:
+        previous = self.last_state
+        self.last_state = MapState(
+            share_array_rows(self.bits, previous and previous.contents),
+            share_array_rows(self.discovered, previous and previous.discovered),
+            share_array_rows(self.visited, previous and previous.visited),
+            self.agent_position,
+            tuple(self.gold_positions),
+            tuple(self.healing_positions),
+        )
+        return self.last_state
+
+    def restore(self, state: MapState):
+        # Stacking copies the rows, so the same snapshot can be restored more than once
+        self.bits = np.stack(state.contents)
+        self.discovered = np.stack(state.discovered)
+        self.visited = np.stack(state.visited)
+        self.agent_position = state.agent_position
+        self.gold_positions = list(state.gold_positions)
+        self.healing_positions = list(state.healing_positions)
+        self.last_state = state
+
+    def positions_of(self, obj: Object):
+        return [(int(x), int(y)) for x, y in np.argwhere(self.bits & OBJECT_BITS[obj])]
+
+    def _add_perceptions(self):
+        for source, perception in PERCEPTION_SOURCES:
+            present = (self.bits & OBJECT_BITS[source]) != 0
+            around = np.zeros_like(present)
+            around[1:, :] |= present[:-1, :]
+            around[:-1, :] |= present[1:, :]
+            around[:, 1:] |= present[:, :-1]
+            around[:, :-1] |= present[:, 1:]
+            self.bits[around] |= OBJECT_BITS[perception]
+
+    def get_cell(self, x: int, y: int) -> GridCell:
+        return GridCell(self, x, y)
+
+    def get_cell_by_map_pos(self, x: int, y: int) -> GridCell:
+        return GridCell(self, self.size - x, y + 1)
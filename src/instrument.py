@@ -0,0 +1,71 @@
+import json
+import os
+import threading
+import time
+from typing import Dict
+
+
+class Metrics:
+    # Per-episode counters and timers. Nothing is measured until methods are
+    # wrapped with attach(), so disabled instrumentation costs nothing.
+    def __init__(self, trace: bool = False):
+        self.counts: Dict[str, int] = {}
+        self.totals: Dict[str, float] = {}
+        self.trace = trace
+        self.events = []
+        self.origin = time.perf_counter()
+
+    def attach(self, obj, method_name: str, label: str = None):
+        label = label or method_name
+        method = getattr(obj, method_name)
+        counts, totals, events = self.counts, self.totals, self.events
+        counts.setdefault(label, 0)
+        totals.setdefault(label, 0.0)
+        trace, origin = self.trace, self.origin
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                end = perf_counter()
+                counts[label] += 1
+                totals[label] += end - start
+                if trace:
+                    events.append((label, start - origin, end - start))
+
+        setattr(obj, method_name, timed)
+
+    def attach_brain(self, brain):
+        # Wrap the knowledge base first so the brain's own wrappers include it
+        self.attach(brain.knowledge_base, "solve", "sat.solve")
+        self.attach(brain.knowledge_base, "add_clause", "kb.add_clause")
+        self.attach(brain, "find_safe_path", "brain.find_safe_path")
+        self.attach(brain, "update_knowledge", "brain.update_knowledge")
+        self.attach(brain, "make_decision", "think")
+
+    def attach_game(self, renderer, trajectory):
+        self.attach(renderer, "draw", "draw")
+        self.attach(trajectory, "on_step", "write")
+        self.attach(trajectory, "on_game_over", "write")
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            label: {
+                "count": self.counts[label],
+                "total_ms": 1000 * self.totals[label],
+                "mean_us": 1e6 * self.totals[label] / self.counts[label] if self.counts[label] else 0.0,
+            }
+            for label in self.counts
+        }
+
+    def dump_chrome_trace(self, filepath: str):
+        # Complete ("X") events, loadable in chrome://tracing or Perfetto
+        pid, tid = os.getpid(), threading.get_ident()
+        trace_events = [
+            {"name": label, "ph": "X", "ts": 1e6 * start, "dur": 1e6 * duration, "pid": pid, "tid": tid}
+            for label, start, duration in self.events
+        ]
+        with open(filepath, "w") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,186 @@
+from solvers import SatSolver, make_solver
+from utils import Object
+from typing import Dict, List, NamedTuple, Tuple, Optional
+
+# Objects the knowledge base reasons about, in variable order
+KB_OBJECTS = [
+    Object.WUMPUS,
+    Object.PIT,
+    Object.POISONOUS_GAS,
+    Object.GOLD,
+    Object.HEALING_POTIONS,
+    Object.STENCH,
+    Object.BREEZE,
+    Object.WHIFF,
+    Object.GLOW,
+]
+KB_ORDINAL = {obj: ordinal for ordinal, obj in enumerate(KB_OBJECTS)}
+
+
+class VariableIndex:
+    # Variable of (x, y, obj) is (x * size + y) * len(KB_OBJECTS) + ordinal + 1,
+    # so every (cell, object) pair gets its own variable
+    def __init__(self, size: int):
+        self.size = size
+        self.width = len(KB_OBJECTS)
+        self.num_variables = size * size * self.width
+
+    def get(self, x: int, y: int, obj: Object) -> int:
+        return (x * self.size + y) * self.width + KB_ORDINAL[obj] + 1
+
+    def lookup(self, variable: int) -> Tuple[Tuple[int, int], Object]:
+        cell, ordinal = divmod(abs(variable) - 1, self.width)
+        return divmod(cell, self.size), KB_OBJECTS[ordinal]
+
+    def describe(self, literal: int) -> str:
+        (x, y), obj = self.lookup(literal)
+        return f"{'-' if literal < 0 else ''}{obj.name}({x}, {y})"
+
+
+class LocalInference:
+    # Unit propagation over the clauses, including the "only one neighbour left"
+    # deduction for percept clauses. Answers most queries without the solver.
+    def __init__(self):
+        self.values: Dict[int, bool] = {}
+        self.watches: Dict[int, List[Tuple[int, ...]]] = {}
+        self.signs: Dict[int, int] = {}
+        self.conflict = False
+        self.mixed = False
+
+    def unassigned(self, clause: Tuple[int, ...]) -> Optional[List[int]]:
+        # None when the clause is already satisfied
+        remaining = []
+        for literal in clause:
+            value = self.values.get(abs(literal))
+            if value is None:
+                remaining.append(literal)
+            elif value == (literal > 0):
+                return None
+        return remaining
+
+    def add_clause(self, clause: Tuple[int, ...]):
+        if self.conflict:
+            return
+        remaining = self.unassigned(clause)
+        if remaining is None:
+            return
+        if len(remaining) <= 1:
+            self.assign(remaining[0] if remaining else clause[0])
+            return
+
+        for literal in clause:
+            variable = abs(literal)
+            self.watches.setdefault(variable, []).append(clause)
+            self.signs[variable] = self.signs.get(variable, 0) | (1 if literal > 0 else 2)
+            self.mixed = self.mixed or self.signs[variable] == 3
+
+    def assign(self, literal: int):
+        queue = [literal]
+        while queue:
+            literal = queue.pop()
+            variable, value = abs(literal), literal > 0
+            if variable in self.values:
+                if self.values[variable] != value:
+                    self.conflict = True
+                    return
+                continue
+
+            self.values[variable] = value
+            for clause in self.watches.pop(variable, ()):
+                remaining = self.unassigned(clause)
+                if remaining is None:
+                    continue
+                if not remaining:
+                    self.conflict = True
+                    return
+                if len(remaining) == 1:
+                    queue.append(remaining[0])
+
+    def is_absent(self, variable: int) -> Optional[bool]:
+        # Same answer as "not solve([variable])", or None when undecided.
+        # A propagation conflict means the clauses are unsatisfiable.
+        if self.conflict or self.values.get(variable) is False:
+            return True
+        # Without mixed polarities every clause still open after propagation can
+        # be satisfied by its remaining literals, so any other variable may be true
+        if not self.mixed:
+            return False
+        return None
+
+
+class KnowledgeState(NamedTuple):
+    # The first count clauses of an append-only log, shared with the store
+    log: List[Tuple[int, ...]]
+    count: int
+    duplicates: int
+    tautologies: int
+
+
+class ClauseStore:
+    def __init__(self, solver: SatSolver = None):
+        self.solver = solver if solver is not None else make_solver()
+        self.local = LocalInference()
+        self.clauses: set[Tuple[int, ...]] = set()
+        self.log: List[Tuple[int, ...]] = []
+        self.variables: set[int] = set()
+        self.duplicates = 0
+        self.tautologies = 0
+
+    @staticmethod
+    def normalise(clause: List[int]) -> Optional[Tuple[int, ...]]:
+        literals = set(clause)
+        # A clause containing both v and -v is always true
+        if any(-literal in literals for literal in literals):
+            return None
+        return tuple(sorted(literals, key=abs))
+
+    def add_clause(self, clause: List[int]) -> bool:
+        normalised = self.normalise(clause)
+        if normalised is None:
+            self.tautologies += 1
+            return False
+        if normalised in self.clauses:
+            self.duplicates += 1
+            return False
+
+        self.clauses.add(normalised)
+        self.log.append(normalised)
+        self.variables.update(abs(literal) for literal in normalised)
+        self.solver.add_clause(list(normalised))
+        self.local.add_clause(normalised)
+        return True
+
+    def solve(self, assumptions: List[int] = ()) -> bool:
+        return self.solver.solve(assumptions=assumptions)
+
+    def snapshot(self) -> KnowledgeState:
+        return KnowledgeState(self.log, len(self.log), self.duplicates, self.tautologies)
+
+    def restore(self, state: KnowledgeState):
+        self.duplicates = state.duplicates
+        self.tautologies = state.tautologies
+        if state.log is self.log and state.count == len(self.log):
+            return
+
+        # Solvers cannot forget clauses, so replay the log into a reset one.
+        # The old log is left untouched for other snapshots that share it.
+        self.solver.reset()
+        self.local = LocalInference()
+        self.clauses = set()
+        self.variables = set()
+        self.log = []
+        for clause in state.log[:state.count]:
+            self.clauses.add(clause)
+            self.log.append(clause)
+            self.variables.update(abs(literal) for literal in clause)
+            self.solver.add_clause(list(clause))
+            self.local.add_clause(clause)
+
+    def num_clauses(self) -> int:
+        return len(self.clauses)
+
+    def num_variables(self) -> int:
+        return len(self.variables)
+
+    def delete(self):
+        self.solver.delete()
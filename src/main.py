@@ -1,10 +1,17 @@
+import argparse
 from game import Game
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Wumpus World")
+    parser.add_argument("--trace", default=None, help="write a Chrome trace of each finished game to this file")
+    parser.add_argument("--record", default=None, help="write a binary replay of each game to this file")
+    parser.add_argument("--replay", default=None, help="open the viewer on a recorded replay instead of the menu")
+    args = parser.parse_args()
+
     # Main game loop
-    game = Game()
-    game.run()
+    game = Game(args.trace, args.record)
+    game.run(args.replay)
 
 
 if __name__ == "__main__":
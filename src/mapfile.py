@@ -0,0 +1,265 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from utils import *
+from typing import Iterator, List, NamedTuple, Tuple
+
+# Packed map (version 2 of the map format): header, then one little-endian
+# uint16 bitmask of the objects placed in each square, row by row.
+# Perceptions are not stored, they are added around the objects on load.
+MAP_MAGIC = b"WWMP"
+VERSION = 2
+MAP_HEADER = struct.Struct("<4sHBxII")  # magic, version, flags, board size, payload bytes
+COMPRESSED = 1
+
+# Archive: header, a fixed-width index entry per map, then the packed maps
+ARCHIVE_MAGIC = b"WWMA"
+ARCHIVE_HEADER = struct.Struct("<4sHxxI")  # magic, version, map count
+INDEX_ENTRY = struct.Struct("<QI52s")  # offset, length, name
+NAME_BYTES = 52
+
+PACKED_EXTENSION = ".wwm"
+ARCHIVE_EXTENSION = ".wwa"
+
+# Objects in a map file and their token in the text format
+TOKEN_OBJECTS = {
+    "W": Object.WUMPUS,
+    "P": Object.PIT,
+    "A": Object.AGENT,
+    "G": Object.GOLD,
+    "P_G": Object.POISONOUS_GAS,
+    "H_P": Object.HEALING_POTIONS,
+}
+PLACED_OBJECTS = list(TOKEN_OBJECTS.values())
+PLACED_BITS = sum(OBJECT_BITS[obj] for obj in PLACED_OBJECTS)
+
+# Objects and the perception they cause around them
+PERCEPTION_SOURCES = [
+    (Object.WUMPUS, Object.STENCH),
+    (Object.PIT, Object.BREEZE),
+    (Object.POISONOUS_GAS, Object.WHIFF),
+    (Object.HEALING_POTIONS, Object.GLOW),
+]
+
+
+def perception_bits(bits: int) -> int:
+    # Perceptions felt around a square holding these objects
+    perceptions = 0
+    for source, perception in PERCEPTION_SOURCES:
+        if bits & OBJECT_BITS[source]:
+            perceptions |= OBJECT_BITS[perception]
+    return perceptions
+
+
+def token_to_bits(token: str) -> int:
+    bits = 0
+    for obj_str in token.split("/"):
+        if obj_str in TOKEN_OBJECTS:
+            bits |= OBJECT_BITS[TOKEN_OBJECTS[obj_str]]
+    return bits
+
+
+def bits_to_token(bits: int) -> str:
+    tokens = [token for token, obj in TOKEN_OBJECTS.items() if bits & OBJECT_BITS[obj]]
+    return "/".join(tokens) if tokens else "-"
+
+
+def text_to_bits(text: str) -> Tuple[int, array]:
+    lines = text.split("\n")
+    size = int(lines[0].strip())
+    tokens = []
+    for line in lines[1:size + 1]:
+        tokens.extend(line.strip().split("."))
+
+    # Most squares share a handful of distinct tokens, parse each one once
+    token_bits = {token: token_to_bits(token) for token in set(tokens)}
+    return size, array("H", [token_bits[token] for token in tokens])
+
+
+def bits_to_text(size: int, bits: array) -> str:
+    tokens = {value: bits_to_token(value) for value in set(bits)}
+    lines = [str(size)]
+    for x in range(size):
+        lines.append(".".join(tokens[value] for value in bits[x * size:(x + 1) * size]))
+    return "\n".join(lines) + "\n"
+
+
+def pack_bits(size: int, bits: array, compress: bool = False) -> bytes:
+    if sys.byteorder == "big":
+        bits = array("H", bits)
+        bits.byteswap()
+    payload = bits.tobytes()
+    if compress:
+        payload = zlib.compress(payload)
+    return MAP_HEADER.pack(MAP_MAGIC, VERSION, COMPRESSED if compress else 0, size, len(payload)) + payload
+
+
+def unpack_bits(buffer, offset: int = 0) -> Tuple[int, array]:
+    magic, version, flags, size, payload_bytes = MAP_HEADER.unpack_from(buffer, offset)
+    if magic != MAP_MAGIC or version != VERSION:
+        raise ValueError("Not a packed map")
+
+    start = offset + MAP_HEADER.size
+    payload = buffer[start:start + payload_bytes]
+    if flags & COMPRESSED:
+        payload = zlib.decompress(payload)
+    bits = array("H")
+    bits.frombytes(payload)
+    if sys.byteorder == "big":
+        bits.byteswap()
+    if len(bits) != size * size:
+        raise ValueError(f"Packed map has {len(bits)} squares, expected {size * size}")
+    return size, bits
+
+
+def text_to_packed(text: str, compress: bool = False) -> bytes:
+    return pack_bits(*text_to_bits(text), compress=compress)
+
+
+def packed_to_text(buffer, offset: int = 0) -> str:
+    return bits_to_text(*unpack_bits(buffer, offset))
+
+
+def is_packed(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAP_MAGIC)) == MAP_MAGIC
+
+
+def is_archive(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(ARCHIVE_MAGIC)) == ARCHIVE_MAGIC
+
+
+def read_packed(path: str) -> Tuple[int, array]:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        return unpack_bits(buffer)
+
+
+def write_archive(path: str, maps: List[Tuple[str, bytes]]):
+    # maps are (name, packed map) pairs, stored in order
+    offset = ARCHIVE_HEADER.size + len(maps) * INDEX_ENTRY.size
+    with open(path, "wb") as f:
+        f.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, VERSION, len(maps)))
+        for name, packed in maps:
+            f.write(INDEX_ENTRY.pack(offset, len(packed), name.encode()[:NAME_BYTES]))
+            offset += len(packed)
+        for _, packed in maps:
+            f.write(packed)
+
+
+class ArchiveEntry(NamedTuple):
+    # One map of an archive, cheap to send to batch workers
+    path: str
+    index: int
+    name: str
+
+
+class MapArchive:
+    # Memory-mapped archive: the index gives the offset of every map, so map k
+    # is read without touching the ones before it
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = ARCHIVE_HEADER.unpack_from(self.buffer, 0)
+        if magic != ARCHIVE_MAGIC or version != VERSION:
+            raise ValueError(f"Not a map archive: {path}")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def entry(self, index: int) -> Tuple[int, int, str]:
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        offset, length, name = INDEX_ENTRY.unpack_from(self.buffer, ARCHIVE_HEADER.size + index * INDEX_ENTRY.size)
+        return offset, length, name.rstrip(b"\0").decode()
+
+    def name(self, index: int) -> str:
+        return self.entry(index)[2]
+
+    def entries(self) -> Iterator[ArchiveEntry]:
+        for index in range(self.count):
+            yield ArchiveEntry(self.path, index, self.name(index))
+
+    def bits(self, index: int) -> Tuple[int, array]:
+        offset, _, _ = self.entry(index)
+        return unpack_bits(self.buffer, offset)
+
+    def text(self, index: int) -> str:
+        return bits_to_text(*self.bits(index))
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+
+def load_source(path: str) -> List[Tuple[str, Tuple[int, array]]]:
+    # Maps of a text map, packed map or archive as (name, (size, bits)) pairs
+    name = os.path.splitext(os.path.basename(path))[0]
+    if is_archive(path):
+        archive = MapArchive(path)
+        try:
+            return [(archive.name(index), archive.bits(index)) for index in range(len(archive))]
+        finally:
+            archive.close()
+    if is_packed(path):
+        return [(name, read_packed(path))]
+    with open(path, "r") as f:
+        return [(name, text_to_bits(f.read()))]
+
+
+def pack(sources: List[str], output: str, compress: bool = False) -> List[str]:
+    # Into one archive when the output ends in .wwa, else one packed map per file
+    maps = [(name, pack_bits(size, bits, compress)) for source in sources for name, (size, bits) in load_source(source)]
+    if output.endswith(ARCHIVE_EXTENSION):
+        write_archive(output, maps)
+        return [output]
+
+    os.makedirs(output, exist_ok=True)
+    paths = []
+    for name, packed in maps:
+        path = os.path.join(output, name + PACKED_EXTENSION)
+        with open(path, "wb") as f:
+            f.write(packed)
+        paths.append(path)
+    return paths
+
+
+def unpack(sources: List[str], directory: str) -> List[str]:
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for source in sources:
+        for name, (size, bits) in load_source(source):
+            path = os.path.join(directory, f"{name}.txt")
+            with open(path, "w") as f:
+                f.write(bits_to_text(size, bits))
+            paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert maps between the text and packed formats")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack_parser = subparsers.add_parser("pack", help="text or packed maps to packed maps or an archive")
+    pack_parser.add_argument("sources", nargs="+", help="map files or archives")
+    pack_parser.add_argument("-o", "--output", required=True, help=f"directory, or archive file ending in {ARCHIVE_EXTENSION}")
+    pack_parser.add_argument("--compress", action="store_true", help="zlib compress each map")
+    unpack_parser = subparsers.add_parser("unpack", help="packed maps or archives to text maps")
+    unpack_parser.add_argument("sources", nargs="+", help="map files or archives")
+    unpack_parser.add_argument("-o", "--output", required=True, help="directory for the text maps")
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        paths = pack(args.sources, args.output, args.compress)
+    else:
+        paths = unpack(args.sources, args.output)
+    for path in paths:
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
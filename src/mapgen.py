@@ -0,0 +1,113 @@
+import argparse
+import os
+import random
+from mapfile import ARCHIVE_EXTENSION, text_to_packed, write_archive
+from typing import Iterator, List, NamedTuple
+
+# Default chance of each object appearing in a square
+PIT_DENSITY = 0.1
+WUMPUS_DENSITY = 0.05
+GAS_DENSITY = 0.03
+POTION_DENSITY = 0.02
+GOLD_DENSITY = 0.05
+
+
+class MapSpec(NamedTuple):
+    size: int
+    seed: int
+    pit_density: float = PIT_DENSITY
+    wumpus_density: float = WUMPUS_DENSITY
+    gas_density: float = GAS_DENSITY
+    potion_density: float = POTION_DENSITY
+    gold_density: float = GOLD_DENSITY
+
+    @property
+    def name(self) -> str:
+        return f"gen-{self.size}x{self.size}-{self.seed}"
+
+    def generate(self) -> str:
+        return generate_map(*self)
+
+
+def generate_rows(size: int, seed: int, pit_density: float = PIT_DENSITY, wumpus_density: float = WUMPUS_DENSITY,
+                  gas_density: float = GAS_DENSITY, potion_density: float = POTION_DENSITY,
+                  gold_density: float = GOLD_DENSITY) -> List[List[str]]:
+    rng = random.Random(seed)
+    objects = [("W", wumpus_density), ("P", pit_density), ("G", gold_density),
+               ("P_G", gas_density), ("H_P", potion_density)]
+
+    rows = []
+    for x in range(size):
+        row = []
+        for y in range(size):
+            tokens = [token for token, density in objects if rng.random() < density]
+            row.append("/".join(tokens) if tokens else "-")
+        rows.append(row)
+
+    # The agent always starts alone in the bottom-left square
+    rows[size - 1][0] = "A"
+    return rows
+
+
+def generate_map(size: int, seed: int, *densities: float) -> str:
+    rows = generate_rows(size, seed, *densities)
+    return f"{size}\n" + "\n".join(".".join(row) for row in rows) + "\n"
+
+
+def iter_specs(count: int, size: int, seed: int, *densities: float) -> Iterator[MapSpec]:
+    # Map i of a corpus is always generated from seed + i
+    for index in range(count):
+        yield MapSpec(size, seed + index, *densities)
+
+
+def write_corpus(directory: str, count: int, size: int, seed: int, *densities: float) -> List[str]:
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for spec in iter_specs(count, size, seed, *densities):
+        path = os.path.join(directory, f"{spec.name}.txt")
+        with open(path, "w") as f:
+            f.write(spec.generate())
+        paths.append(path)
+    return paths
+
+
+def write_archive_corpus(path: str, count: int, size: int, seed: int, *densities: float,
+                         compress: bool = False) -> List[str]:
+    maps = [(spec.name, text_to_packed(spec.generate(), compress)) for spec in iter_specs(count, size, seed, *densities)]
+    write_archive(path, maps)
+    return [path]
+
+
+def add_generator_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--size", type=int, default=10, help="board size of generated maps")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first generated map")
+    parser.add_argument("--pit-density", type=float, default=PIT_DENSITY)
+    parser.add_argument("--wumpus-density", type=float, default=WUMPUS_DENSITY)
+    parser.add_argument("--gas-density", type=float, default=GAS_DENSITY)
+    parser.add_argument("--potion-density", type=float, default=POTION_DENSITY)
+    parser.add_argument("--gold-density", type=float, default=GOLD_DENSITY)
+
+
+def densities_from_args(args) -> List[float]:
+    return [args.pit_density, args.wumpus_density, args.gas_density, args.potion_density, args.gold_density]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate reproducible random Wumpus World maps")
+    parser.add_argument("directory", help=f"output directory, or map archive file ending in {ARCHIVE_EXTENSION}")
+    parser.add_argument("-n", "--count", type=int, default=1, help="number of maps")
+    parser.add_argument("--compress", action="store_true", help="zlib compress the maps of an archive")
+    add_generator_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.directory.endswith(ARCHIVE_EXTENSION):
+        paths = write_archive_corpus(args.directory, args.count, args.size, args.seed, *densities_from_args(args),
+                                     compress=args.compress)
+    else:
+        paths = write_corpus(args.directory, args.count, args.size, args.seed, *densities_from_args(args))
+    for path in paths:
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
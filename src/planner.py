@@ -0,0 +1,107 @@
+import heapq
+from utils import *
+from adjacency import adjacency
+from typing import List, Tuple, Set, Optional
+
+# Turning to any heading is a single action, like moving forward
+MOVE_COST = 1
+TURN_COST = 1
+
+
+def manhattan_distance(cell1: Tuple[int, int], cell2: Tuple[int, int]) -> int:
+    return abs(cell1[0] - cell2[0]) + abs(cell1[1] - cell2[1])
+
+
+def direction_between(cell: Tuple[int, int], next_cell: Tuple[int, int]) -> Direction:
+    delta = (next_cell[0] - cell[0], next_cell[1] - cell[1])
+    for direction, direction_delta in DIRECTION_DELTAS.items():
+        if direction_delta == delta:
+            return direction
+    raise ValueError(f"Cells are not adjacent: {cell}, {next_cell}")
+
+
+def plan_actions(path: List[Tuple[int, int]], heading: Direction) -> List[Tuple[Action, Tuple[int, int], Direction, Direction]]:
+    # Each step is (action, position, heading before, heading after)
+    actions = []
+    for cell, next_cell in zip(path, path[1:]):
+        direction = direction_between(cell, next_cell)
+        if heading != direction:
+            actions.append((TURN_ACTIONS[(heading, direction)], cell, heading, direction))
+            heading = direction
+        actions.append((Action.MOVE_FORWARD, cell, heading, heading))
+    return actions
+
+
+class PathPlanner:
+    def __init__(self, size: int):
+        self.size = size
+        self.adjacency = adjacency(size)
+        self.goal: Optional[Tuple[int, int]] = None
+        self.path: List[Tuple[int, int]] = []
+        self.plans = 0
+        self.cache_hits = 0
+
+    def find_path(self, start: Tuple[int, int], goal: Tuple[int, int], passable: Set[Tuple[int, int]],
+                  heading: Optional[Direction] = None) -> List[Tuple[int, int]]:
+        cached = self.cached_path(start, goal, passable)
+        if cached:
+            self.cache_hits += 1
+            return cached
+
+        self.plans += 1
+        self.goal = goal
+        self.path = self.a_star(start, goal, passable, heading)
+        return self.path
+
+    def cached_path(self, start: Tuple[int, int], goal: Tuple[int, int], passable: Set[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        # Reuse the last route while the agent is on it and it is still safe
+        if goal != self.goal or start not in self.path:
+            return []
+        remaining = self.path[self.path.index(start):]
+        if any(cell not in passable for cell in remaining[1:]):
+            return []
+        return remaining
+
+    def invalidate(self):
+        self.goal = None
+        self.path = []
+
+    def a_star(self, start: Tuple[int, int], goal: Tuple[int, int], passable: Set[Tuple[int, int]],
+               heading: Optional[Direction] = None) -> List[Tuple[int, int]]:
+        # Search over (cell, heading) states so that turns are paid for
+        start_state = (start, heading)
+        parents = {start_state: None}
+        costs = {start_state: 0}
+        counter = 0
+        open_heap = [(manhattan_distance(start, goal), counter, start_state)]
+
+        while open_heap:
+            _, _, state = heapq.heappop(open_heap)
+            cell, cell_heading = state
+            if cell == goal:
+                return self.reconstruct(parents, state)
+
+            cost = costs[state]
+            for direction, next_cell in self.adjacency.moves_of(*cell):
+                if next_cell not in passable:
+                    continue
+
+                next_state = (next_cell, direction)
+                next_cost = cost + MOVE_COST
+                if cell_heading is not None and cell_heading != direction:
+                    next_cost += TURN_COST
+                if next_cost < costs.get(next_state, next_cost + 1):
+                    costs[next_state] = next_cost
+                    parents[next_state] = state
+                    counter += 1
+                    heapq.heappush(open_heap, (next_cost + manhattan_distance(next_cell, goal), counter, next_state))
+
+        return []  # No path found
+
+    def reconstruct(self, parents, state) -> List[Tuple[int, int]]:
+        path = []
+        while state is not None:
+            path.append(state[0])
+            state = parents[state]
+        path.reverse()
+        return path
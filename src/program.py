@@ -1,45 +1,94 @@
+import io
 from utils import *
-from typing import List, Tuple, Optional
-import pygame
+from adjacency import Adjacency, adjacency
+from mapfile import PLACED_OBJECTS, PLACED_BITS, bits_to_token, perception_bits, is_archive, is_packed, read_packed, unpack_bits
+from typing import Any, FrozenSet, List, NamedTuple, Set, Tuple, Optional
 
 
 class Cell:
+    __slots__ = ("position", "cell_type", "flags", "is_visited")
+
     def __init__(self, position: Tuple[int, int]):
         self.position = position
         
         self.cell_type = CellType.UNDISCOVERED
-        self.contents: set[Object] = set()
+        self.flags = 0  # One bit per Object, see OBJECT_BITS
         self.is_visited = False
 
+    @property
+    def contents(self) -> set[Object]:
+        return {obj for obj, bit in OBJECT_BITS.items() if self.flags & bit}
+
     def discover(self):
         if self.cell_type == CellType.UNDISCOVERED:
             self.cell_type = CellType.DISCOVERED
 
     def add_content(self, content: Object):
         if content in Object:
-            self.contents.add(content)
+            self.flags |= OBJECT_BITS[content]
         else:
             raise ValueError(f"Invalid content: {content}")
 
     def remove_content(self, content: Object):
-        self.contents.discard(content)
+        self.flags &= ~OBJECT_BITS[content]
 
     def has_content(self, content: Object) -> bool:
-        return content in self.contents
+        return bool(self.flags & OBJECT_BITS[content])
 
     def mark_visited(self):
         self.is_visited = True
 
     def is_dangerous(self):
-        return any(
-            content in [Object.WUMPUS, Object.PIT, Object.POISONOUS_GAS]
-            for content in self.contents
-        )
+        return bool(self.flags & DANGER_BITS)
 
     def is_safe(self):
         return not self.is_dangerous() and self.cell_type == CellType.DISCOVERED
 
 
+def share_rows(rows: List[Tuple], previous: Optional[Tuple[Tuple, ...]]) -> Tuple[Tuple, ...]:
+    # Rows equal to the previous snapshot's reuse its tuples, so a snapshot
+    # only holds new copies of the rows that changed since then
+    if previous is None or len(previous) != len(rows):
+        return tuple(rows)
+    return tuple(old if old == new else new for new, old in zip(rows, previous))
+
+
+class SetState(NamedTuple):
+    # A set as a base shared between snapshots plus the changes since the base
+    base: FrozenSet
+    added: FrozenSet
+    removed: FrozenSet
+
+
+def freeze_set(current: Set, previous: Optional[SetState]) -> SetState:
+    # Later snapshots keep the previous base until their changes outgrow half
+    # of it, then start again from a full copy
+    if previous is not None:
+        base = previous.base
+        added = frozenset(current - base)
+        removed = base - current
+        if len(added) + len(removed) <= len(base) // 2:
+            return SetState(base, added, removed)
+    return SetState(frozenset(current), frozenset(), frozenset())
+
+
+def thaw_set(state: SetState) -> Set:
+    cells = set(state.base)
+    cells -= state.removed
+    cells |= state.added
+    return cells
+
+
+class MapState(NamedTuple):
+    # Per-square contents, discovery and visits, one entry per row
+    contents: Any
+    discovered: Any
+    visited: Any
+    agent_position: Optional[Tuple[int, int]]
+    gold_positions: Tuple[Tuple[int, int], ...]
+    healing_positions: Tuple[Tuple[int, int], ...]
+
+
 class Map:
     def __init__(self):
         self.size: int = 0
@@ -48,21 +97,77 @@ class Map:
         self.agent_position: Optional[Tuple[int, int]] = None
         self.gold_positions: List[Tuple[int, int]] = []
         self.healing_positions: List[Tuple[int, int]] = []
+        self.adjacency: Optional[Adjacency] = None
+        self.last_state: Optional[MapState] = None
         # self.wumpus_positions: List[Tuple[int, int]] = []
 
     def load_map(self, filepath: str):
+        # Packed maps are recognised by their header, anything else is text.
+        # An archive holds many maps, so one is picked with MapArchive instead.
+        if is_archive(filepath):
+            raise ValueError(f"{filepath} is a map archive, load one of its maps with MapArchive.bits")
+        if is_packed(filepath):
+            self.load_object_bits(*read_packed(filepath))
+            return
         with open(filepath, "r") as f:
-            self.size = int(f.readline().strip())
-
-            self.grid = [[Cell((x, y)) for y in range(self.size)] for x in range(self.size)]
-            self.matrix = [[] for _ in range(self.size)]
-            for x in range(self.size):
-                line = f.readline().strip().split(".")
-                for y, char in enumerate(line):
-                    self.matrix[x].append(char)
-                    self._process_cell(x, y, char)
+            self.read_map(f)
+
+    def load_text(self, text: str):
+        self.read_map(io.StringIO(text))
+
+    def load_packed(self, buffer, offset: int = 0):
+        self.load_object_bits(*unpack_bits(buffer, offset))
+
+    def load_object_bits(self, size: int, bits):
+        # Row by row bitmasks of the placed objects, as stored in packed maps
+        self.size = size
+        self.adjacency = adjacency(size)
+        self.last_state = None
+        self.grid = [[Cell((x, y)) for y in range(size)] for x in range(size)]
+        self.gold_positions = []
+        self.healing_positions = []
+
+        values = set(bits)
+        tokens = {value: bits_to_token(value) for value in values}
+        self.matrix = [[tokens[value] for value in bits[x * size:(x + 1) * size]] for x in range(size)]
+
+        # Perceptions are spread on the flat bitmasks rather than cell by cell
+        flags = [value & PLACED_BITS for value in bits]
+        spread = {value: perception_bits(value) for value in values}
+        neighbour_ids = self.adjacency.neighbour_ids
+        for index, value in enumerate(bits):
+            if spread[value]:
+                for neighbour in neighbour_ids(index):
+                    flags[neighbour] |= spread[value]
+
+        placed = {value: [obj for obj in PLACED_OBJECTS if value & OBJECT_BITS[obj]] for value in values}
+        for index, value in enumerate(flags):
+            if not value:
+                continue
+            x, y = divmod(index, size)
+            self.grid[x][y].flags = value
+            for obj in placed[bits[index]]:
+                if obj == Object.AGENT:
+                    self.agent_position = (x, y)
+                elif obj == Object.GOLD:
+                    self.gold_positions.append((x, y))
+                elif obj == Object.HEALING_POTIONS:
+                    self.healing_positions.append((x, y))
+
+    def read_map(self, f):
+        self.size = int(f.readline().strip())
+        self.adjacency = adjacency(self.size)
+        self.last_state = None
+
+        self.grid = [[Cell((x, y)) for y in range(self.size)] for x in range(self.size)]
+        self.matrix = [[] for _ in range(self.size)]
+        for x in range(self.size):
+            line = f.readline().strip().split(".")
+            for y, char in enumerate(line):
+                self.matrix[x].append(char)
+                self._process_cell(x, y, char)
 
-        self._add_perceptions() 
+        self._add_perceptions()
 
     def _process_cell(self, x: int, y: int, cell_contents: str):
         cell = self.grid[x][y]
@@ -98,10 +203,31 @@ class Map:
                     self._add_perception_around(x, y, Object.GLOW)
 
     def _add_perception_around(self, x: int, y: int, perception: Object):
-        for dx, dy in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-            new_x, new_y = x + dx, y + dy
-            if 0 <= new_x < self.size and 0 <= new_y < self.size:
-                self.grid[new_x][new_y].add_content(perception)
+        for new_x, new_y in self.adjacency.around(x, y):
+            self.grid[new_x][new_y].add_content(perception)
+
+    def snapshot(self) -> MapState:
+        previous = self.last_state
+        self.last_state = MapState(
+            share_rows([tuple(cell.flags for cell in row) for row in self.grid], previous and previous.contents),
+            share_rows([tuple(cell.cell_type for cell in row) for row in self.grid], previous and previous.discovered),
+            share_rows([tuple(cell.is_visited for cell in row) for row in self.grid], previous and previous.visited),
+            self.agent_position,
+            tuple(self.gold_positions),
+            tuple(self.healing_positions),
+        )
+        return self.last_state
+
+    def restore(self, state: MapState):
+        for row, flags, cell_types, visited in zip(self.grid, state.contents, state.discovered, state.visited):
+            for cell, cell_flags, cell_type, cell_visited in zip(row, flags, cell_types, visited):
+                cell.flags = cell_flags
+                cell.cell_type = cell_type
+                cell.is_visited = cell_visited
+        self.agent_position = state.agent_position
+        self.gold_positions = list(state.gold_positions)
+        self.healing_positions = list(state.healing_positions)
+        self.last_state = state
 
     def get_cell(self, x: int, y: int) -> Cell:
         return self.grid[x][y]
@@ -120,6 +246,5 @@ class Map:
     def is_valid_position(self, x: int, y: int) -> bool:
         return 0 <= x < self.size and 0 <= y < self.size
 
-    def get_adjacent_cells(self, x: int, y: int) -> List[Tuple[int, int]]:
-        adjacent = [(x-1, y), (x+1, y), (x, y-1), (x, y+1)]
-        return [(ax, ay) for ax, ay in adjacent if self.is_valid_position(ax, ay)]
\ No newline at end of file
+    def get_adjacent_cells(self, x: int, y: int) -> Tuple[Tuple[int, int], ...]:
+        return self.adjacency.around(x, y)
\ No newline at end of file
@@ -0,0 +1,162 @@
+import pygame
+from utils import *
+from typing import List, Tuple
+
+INFO_WIDTH = SCREEN_WIDTH - SCREEN_HEIGHT
+
+
+class BoardRenderer:
+    # Keeps a pre-composited board surface and only redraws the cells that changed
+    def __init__(self, screen, map, simulator, agent, images, cell_size, text_font, map_number, timeline):
+        self.screen = screen
+        self.map = map
+        self.simulator = simulator
+        self.agent = agent
+        self.images = images
+        self.cell_size = cell_size
+        self.text_font = text_font
+        self.map_number = map_number
+        self.timeline = timeline
+
+        self.board = pygame.Surface((cell_size * map.size, cell_size * map.size))
+        self.info_surface = pygame.Surface((INFO_WIDTH, SCREEN_HEIGHT))
+        self.info_state = None
+        self.status = ""
+        self.info_dirty = True
+        self.full_redraw = True
+        self.dirty_cells = {(row, col) for row in range(map.size) for col in range(map.size)}
+
+    # Simulator observer events
+    def on_step(self, simulator, action, last_position):
+        self.mark_dirty(last_position)
+        self.mark_dirty(self.map.agent_position)
+
+    def on_restore(self, simulator):
+        self.mark_all_dirty()
+
+    def on_scream(self, target_position):
+        self.mark_dirty(target_position)
+
+    def mark_dirty(self, position: Tuple[int, int]):
+        # Grabbing and shooting also change the perceptions around a cell
+        self.dirty_cells.add(position)
+        self.dirty_cells.update(self.map.get_adjacent_cells(*position))
+
+    def mark_rect_dirty(self, rect: pygame.Rect):
+        # Cells and info board under a screen area, e.g. an overlay that went away
+        board_size = self.cell_size * self.map.size
+        if rect.left < board_size and rect.top < board_size:
+            first_row, last_row = max(0, rect.top // self.cell_size), min(self.map.size - 1, (rect.bottom - 1) // self.cell_size)
+            first_col, last_col = max(0, rect.left // self.cell_size), min(self.map.size - 1, (rect.right - 1) // self.cell_size)
+            for row in range(first_row, last_row + 1):
+                for col in range(first_col, last_col + 1):
+                    self.dirty_cells.add((row, col))
+        if rect.right > SCREEN_HEIGHT:
+            self.info_dirty = True
+
+    def mark_all_dirty(self):
+        self.full_redraw = True
+        self.info_dirty = True
+        self.dirty_cells = {(row, col) for row in range(self.map.size) for col in range(self.map.size)}
+
+    def draw(self, now: int) -> List[pygame.Rect]:
+        # Overlays are drawn over fresh cells every frame and cleared when they end
+        for rect in self.timeline.update(now):
+            self.mark_rect_dirty(rect)
+        overlays = self.timeline.visible()
+        for overlay in overlays:
+            self.mark_rect_dirty(overlay.rect)
+
+        rects = []
+        if self.full_redraw:
+            self.screen.fill(WHITE)
+
+        for row, col in self.dirty_cells:
+            self.draw_cell(row, col)
+            rect = pygame.Rect(col * self.cell_size, row * self.cell_size, self.cell_size, self.cell_size)
+            self.screen.blit(self.board, rect, rect)
+            rects.append(rect)
+        self.dirty_cells.clear()
+
+        rects.extend(self.draw_info_board())
+
+        for overlay in overlays:
+            self.screen.blit(overlay.image, overlay.rect)
+            rects.append(overlay.rect)
+
+        if self.full_redraw:
+            self.full_redraw = False
+            return [self.screen.get_rect()]
+        return rects
+
+    def draw_cell(self, row: int, col: int):
+        images = self.images
+        cell = self.map.get_cell(row, col)
+        x = col * self.cell_size
+        y = row * self.cell_size
+
+        # Draw base cell
+        if cell.cell_type == CellType.UNDISCOVERED:
+            self.board.blit(images['undiscovered'], (x, y))
+        else:
+            self.board.blit(images['discovered'], (x, y))
+
+            # Draw cell contents
+            if cell.has_content(Object.PIT):
+                self.board.blit(images['pit'], (x, y))
+            elif cell.has_content(Object.GOLD):
+                self.board.blit(images['gold'], (x, y))
+            elif cell.has_content(Object.WUMPUS):
+                self.board.blit(images['wumpus'], (x, y))
+            elif cell.has_content(Object.POISONOUS_GAS):
+                self.board.blit(images['poisonous_gas'], (x, y))
+            elif cell.has_content(Object.HEALING_POTIONS):
+                self.board.blit(images['healing_potions'], (x, y))
+
+            # Draw perceptions
+            else:
+                if cell.has_content(Object.BREEZE):
+                    self.board.blit(images['breeze'], (x, y))
+                if cell.has_content(Object.GLOW):
+                    self.board.blit(images['glow'], (x, y))
+                if cell.has_content(Object.STENCH):
+                    self.board.blit(images['stench'], (x, y))
+                if cell.has_content(Object.WHIFF):
+                    self.board.blit(images['whiff'], (x, y))
+                if cell.has_content(Object.SCREAM):
+                    self.board.blit(images['scream'], (x, y))
+
+        # Draw agent
+        if self.map.agent_position == (row, col):
+            self.board.blit(self.agent.image, (x, y))
+
+        # Draw grid lines
+        pygame.draw.line(self.board, BLACK, (x, y), (x + self.cell_size, y))
+        pygame.draw.line(self.board, BLACK, (x, y), (x, y + self.cell_size))
+
+    def draw_info_board(self) -> List[pygame.Rect]:
+        info_rect = pygame.Rect(SCREEN_HEIGHT, 0, INFO_WIDTH, SCREEN_HEIGHT)
+
+        # Text is only rendered again when the score, health or status changes
+        info_state = (self.simulator.score, self.simulator.health, self.status)
+        if info_state != self.info_state:
+            self.info_state = info_state
+            self.info_dirty = True
+            self.render_info(*info_state)
+
+        rects = []
+        if self.info_dirty:
+            self.info_dirty = False
+            self.screen.blit(self.info_surface, info_rect)
+            rects.append(info_rect)
+
+        return rects
+
+    def render_info(self, score: int, health: int, status: str):
+        self.info_surface.fill(LIGHT_GRAY)
+
+        # Add game information
+        lines = [("GAME INFO", 50), (f"MAP: {self.map_number}", 150), (f"SCORE: {score}", 200), (f"HEALTH: {health}", 250), (status, 350)]
+        for text, top in lines:
+            text_surface = self.text_font.render(text, True, BLACK)
+            self.info_surface.blit(text_surface, ((INFO_WIDTH - text_surface.get_width()) // 2, top))
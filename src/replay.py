@@ -0,0 +1,252 @@
+import mmap
+import struct
+from utils import *
+from program import Map, MapState
+from simulator import MAX_HEALTH, OUTCOME_RUNNING, OUTCOME_CLIMB, OUTCOME_DIE, OUTCOME_TIMEOUT
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# File layout: header, map text, then one fixed-width record per step
+MAGIC = b"WWRP"
+VERSION = 1
+HEADER = struct.Struct("<4sHHII")  # magic, version, board size, steps, map text bytes
+RECORD = struct.Struct("<BBBxHHHihHHH")
+NO_CELL = 0xFFFF
+FORMAT_REPLAY = "replay"
+
+# Board states are kept every this many steps so any step is a short replay away
+KEYFRAME_INTERVAL = 256
+
+OUTCOMES = [OUTCOME_RUNNING, OUTCOME_CLIMB, OUTCOME_DIE, OUTCOME_TIMEOUT]
+# Objects whose removal the replay records; perceptions are derived from them
+REMOVABLE = [Object.WUMPUS, Object.GOLD, Object.HEALING_POTIONS]
+MAP_TOKENS = [(Object.WUMPUS, "W"), (Object.PIT, "P"), (Object.GOLD, "G"), (Object.POISONOUS_GAS, "P_G"),
+              (Object.HEALING_POTIONS, "H_P"), (Object.AGENT, "A")]
+
+ACTIONS = list(Action)
+DIRECTIONS = list(Direction)
+
+
+class ReplayRecord(NamedTuple):
+    action: Optional[Action]
+    heading: Direction
+    alive: bool
+    outcome: str
+    position: Tuple[int, int]
+    # Felt at the position above, after the step
+    perceptions: int
+    score: int
+    health: int
+    # Square that lost an object this step and the bits of what it lost
+    changed: Optional[Tuple[int, int]]
+    removed: int
+
+
+def object_bits(objects) -> int:
+    bits = 0
+    for obj in objects:
+        bits |= OBJECT_BITS[obj]
+    return bits
+
+
+def map_to_text(map: Map) -> str:
+    lines = [str(map.size)]
+    for x in range(map.size):
+        tokens = []
+        for y in range(map.size):
+            contents = map.get_cell(x, y).contents
+            names = [token for obj, token in MAP_TOKENS if obj in contents]
+            tokens.append("/".join(names) if names else "-")
+        lines.append(".".join(tokens))
+    return "\n".join(lines) + "\n"
+
+
+def encode_record(record: ReplayRecord) -> bytes:
+    changed = record.changed if record.changed is not None else (NO_CELL, NO_CELL)
+    action = ACTIONS.index(record.action) + 1 if record.action is not None else 0
+    flags = int(record.alive) | OUTCOMES.index(record.outcome) << 1
+    return RECORD.pack(action, DIRECTIONS.index(record.heading), flags, *record.position, record.perceptions,
+                       record.score, record.health, *changed, record.removed)
+
+
+def decode_record(buffer, offset: int) -> ReplayRecord:
+    action, heading, flags, x, y, perceptions, score, health, changed_x, changed_y, removed = RECORD.unpack_from(buffer, offset)
+    return ReplayRecord(
+        ACTIONS[action - 1] if action else None,
+        DIRECTIONS[heading],
+        bool(flags & 1),
+        OUTCOMES[flags >> 1],
+        (x, y),
+        perceptions,
+        score,
+        health,
+        (changed_x, changed_y) if changed_x != NO_CELL else None,
+        removed,
+    )
+
+
+def apply_record(map: Map, record: ReplayRecord):
+    # Same board changes as the simulator, driven by the recorded removals
+    map.agent_position = record.position
+    cell = map.get_cell(*record.position)
+    cell.discover()
+    cell.mark_visited()
+    if record.changed is None:
+        return
+
+    changed = map.get_cell(*record.changed)
+    for obj in REMOVABLE:
+        if not record.removed & OBJECT_BITS[obj]:
+            continue
+        changed.remove_content(obj)
+        if obj == Object.WUMPUS:
+            for adj in map.get_adjacent_cells(*record.changed):
+                map.get_cell(*adj).remove_content(Object.STENCH)
+        elif obj == Object.HEALING_POTIONS:
+            for adj in map.get_adjacent_cells(*record.changed):
+                map.get_cell(*adj).remove_content(Object.GLOW)
+            if record.changed in map.healing_positions:
+                map.healing_positions.remove(record.changed)
+        elif obj == Object.GOLD and record.changed in map.gold_positions:
+            map.gold_positions.remove(record.changed)
+
+
+class ReplayWriter:
+    # Simulator observer that records a binary replay of the episode
+    def __init__(self, filepath: str, map: Map):
+        self.filepath = filepath
+        self.map = map
+        self.steps = 0
+        map_text = map_to_text(map).encode()
+        self.map_bytes = len(map_text)
+        self.file = open(filepath, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, map.size, 0, self.map_bytes))
+        self.file.write(map_text)
+
+        self.objects = self.scan_objects()
+        self.scream_target: Optional[Tuple[int, int]] = None
+
+    def scan_objects(self) -> Dict[Tuple[int, int], int]:
+        # Objects that can still be removed, to spot what each step took away
+        removable = object_bits(REMOVABLE)
+        objects = {}
+        for x in range(self.map.size):
+            for y in range(self.map.size):
+                bits = removable & object_bits(self.map.get_cell(x, y).contents)
+                if bits:
+                    objects[(x, y)] = bits
+        return objects
+
+    # Simulator observer events
+    def on_scream(self, target_position):
+        self.scream_target = target_position
+
+    def on_step(self, simulator, action, last_position):
+        changed, removed = None, 0
+        for position in [self.scream_target, last_position, self.map.agent_position]:
+            if position is None or position not in self.objects:
+                continue
+            bits = self.objects[position]
+            remaining = bits & object_bits(self.map.get_cell(*position).contents)
+            if remaining != bits:
+                changed, removed = position, bits & ~remaining
+                self.objects[position] = remaining
+                break
+        self.scream_target = None
+
+        self.file.write(encode_record(ReplayRecord(
+            action, simulator.brain.direction, simulator.is_alive, simulator.outcome, self.map.agent_position,
+            object_bits(simulator.perceive()), simulator.score, simulator.health, changed, removed,
+        )))
+        self.steps += 1
+
+    def on_game_over(self, simulator, action):
+        # The outcome is only known now, so patch the flags of the last record
+        flags = int(simulator.is_alive) | OUTCOMES.index(simulator.outcome) << 1
+        self.file.seek(-RECORD.size + 2, 1)
+        self.file.write(bytes([flags]))
+        self.file.seek(0, 2)
+        self.close()
+
+    def on_restore(self, simulator):
+        # Undone steps are dropped so the replay stays one consistent episode
+        if self.file.closed:
+            return
+        self.steps = simulator.steps
+        self.file.truncate(HEADER.size + self.map_bytes + self.steps * RECORD.size)
+        self.file.seek(0, 2)
+        self.objects = self.scan_objects()
+        self.scream_target = None
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.map.size, self.steps, self.map_bytes))
+        self.file.close()
+
+
+class ReplayReader:
+    # Memory-mapped replay: records are decoded on demand, so opening a long
+    # episode is instant and any step can be read directly
+    def __init__(self, filepath: str):
+        self.file = open(filepath, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size, _, map_bytes = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a replay file: {filepath}")
+
+        self.map_text = self.buffer[HEADER.size:HEADER.size + map_bytes].decode()
+        self.records_offset = HEADER.size + map_bytes
+        # The step count in the header is only written on close, so a replay of
+        # a crashed or killed game still says 0. Count the whole records instead.
+        self.steps = (len(self.buffer) - self.records_offset) // RECORD.size
+
+        self.map = Map()
+        self.map.load_text(self.map_text)
+        first_cell = self.map.get_cell(*self.map.agent_position)
+        first_cell.discover()
+        first_cell.mark_visited()
+        self.keyframes: Dict[int, MapState] = {0: self.map.snapshot()}
+
+    def __len__(self) -> int:
+        return self.steps
+
+    def __getitem__(self, step: int) -> ReplayRecord:
+        if not 0 <= step < self.steps:
+            raise IndexError(step)
+        return decode_record(self.buffer, self.records_offset + step * RECORD.size)
+
+    def records(self) -> List[ReplayRecord]:
+        return [self[step] for step in range(self.steps)]
+
+    def board_at(self, step: int) -> Map:
+        # Board after the given number of steps, 0 being the board before the first move
+        step = max(0, min(step, self.steps))
+        start = max(keyframe for keyframe in self.keyframes if keyframe <= step)
+        self.map.restore(self.keyframes[start])
+        for index in range(start, step):
+            apply_record(self.map, self[index])
+            if (index + 1) % KEYFRAME_INTERVAL == 0:
+                self.keyframes.setdefault(index + 1, self.map.snapshot())
+        return self.map
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+
+class ReplayCursor:
+    # Step of a replay being shown, with the score and health the info board reads
+    def __init__(self, reader: ReplayReader):
+        self.reader = reader
+        self.step = 0
+        self.seek(0)
+
+    def seek(self, step: int):
+        self.step = max(0, min(step, len(self.reader)))
+        self.map = self.reader.board_at(self.step)
+        if self.step == 0:
+            self.heading, self.score, self.health, self.outcome = Direction.UP, 0, MAX_HEALTH, OUTCOME_RUNNING
+        else:
+            record = self.reader[self.step - 1]
+            self.heading, self.score, self.health, self.outcome = record.heading, record.score, record.health, record.outcome
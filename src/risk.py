@@ -0,0 +1,234 @@
+import random
+import time
+from utils import *
+from program import freeze_set, thaw_set
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+# Percept felt next to each danger, and the chance the agent assumes for the
+# danger in a square it knows nothing about
+PERCEPT_DANGERS = [(Object.BREEZE, Object.PIT), (Object.STENCH, Object.WUMPUS), (Object.WHIFF, Object.POISONOUS_GAS)]
+PIT_PRIOR = 0.1
+WUMPUS_PRIOR = 0.05
+GAS_PRIOR = 0.03
+DANGER_PRIORS = {Object.PIT: PIT_PRIOR, Object.WUMPUS: WUMPUS_PRIOR, Object.POISONOUS_GAS: GAS_PRIOR}
+
+# Components with up to this many cells are counted exactly (about 3 ms at the
+# limit), larger ones are sampled
+EXACT_LIMIT = 10
+SAMPLES = 2000
+BURN_IN = 50
+BUDGET_MS = 5
+
+Constraint = FrozenSet[Tuple[int, int]]
+
+
+def exact_marginals(cells: List[Tuple[int, int]], constraints: List[Constraint], prior: float) -> Dict[Tuple[int, int], float]:
+    # Weighted model count over every assignment of the component
+    bits = {cell: 1 << index for index, cell in enumerate(cells)}
+    masks = [sum(bits[cell] for cell in constraint) for constraint in constraints]
+    n = len(cells)
+    weights = [prior ** k * (1 - prior) ** (n - k) for k in range(n + 1)]
+
+    total = 0.0
+    counts = [0.0] * n
+    for model in range(1 << n):
+        if not all(model & mask for mask in masks):
+            continue
+        weight = weights[bin(model).count("1")]
+        total += weight
+        for index in range(n):
+            if model >> index & 1:
+                counts[index] += weight
+
+    if total == 0:
+        return {cell: prior for cell in cells}
+    return {cell: counts[index] / total for index, cell in enumerate(cells)}
+
+
+def sampled_marginals(cells: List[Tuple[int, int]], constraints: List[Constraint], prior: float,
+                      samples: int, deadline: float, seed: int = 0) -> Tuple[Dict[Tuple[int, int], float], int]:
+    # Gibbs sampling over the models: a cell can only be cleared when every
+    # constraint it is in still has another dangerous cell. Also returns the
+    # number of samples taken, which is short of samples past the deadline.
+    rng = random.Random(seed)
+    index = {cell: i for i, cell in enumerate(cells)}
+    members = [[index[cell] for cell in constraint] for constraint in constraints]
+    cell_constraints = [[] for _ in cells]
+    for constraint_index, constraint in enumerate(members):
+        for i in constraint:
+            cell_constraints[i].append(constraint_index)
+
+    state = [False] * len(cells)
+    support = [0] * len(members)
+    for constraint_index, constraint in enumerate(members):
+        if not support[constraint_index]:
+            chosen = rng.choice(constraint)
+            state[chosen] = True
+            for other in cell_constraints[chosen]:
+                support[other] += 1
+
+    counts = [0] * len(cells)
+    taken = 0
+    sweep = 0
+    while taken < samples and time.perf_counter() < deadline:
+        for i in range(len(cells)):
+            if state[i]:
+                for constraint_index in cell_constraints[i]:
+                    support[constraint_index] -= 1
+            required = any(support[constraint_index] == 0 for constraint_index in cell_constraints[i])
+            state[i] = required or rng.random() < prior
+            if state[i]:
+                for constraint_index in cell_constraints[i]:
+                    support[constraint_index] += 1
+
+        sweep += 1
+        if sweep > BURN_IN:
+            taken += 1
+            for i in range(len(cells)):
+                counts[i] += state[i]
+
+    if not taken:
+        return {cell: prior for cell in cells}, 0
+    return {cell: counts[i] / taken for i, cell in enumerate(cells)}, taken
+
+
+class RiskModel:
+    # Probability of each danger in the squares the agent has not visited,
+    # from the percepts felt in the squares it has. Constraints that share
+    # squares form a component; components are independent and their
+    # marginals are cached until one of their constraints changes. Sampling
+    # cut short by the deadline is used for the current step only.
+    def __init__(self, priors: Dict[Object, float] = None, exact_limit: int = EXACT_LIMIT,
+                 samples: int = SAMPLES, budget_ms: float = BUDGET_MS):
+        self.priors = priors if priors is not None else DANGER_PRIORS
+        self.exact_limit = exact_limit
+        self.samples = samples
+        self.budget_ms = budget_ms
+
+        self.clear: Dict[Object, Set[Tuple[int, int]]] = {danger: set() for danger in self.priors}
+        # Visited square -> neighbours of which at least one holds the danger
+        self.required: Dict[Object, Dict[Tuple[int, int], Constraint]] = {danger: {} for danger in self.priors}
+        self.component_cache: Dict[Tuple[Object, FrozenSet[Constraint]], Dict[Tuple[int, int], float]] = {}
+        self.marginals: Dict[Object, Dict[Tuple[int, int], float]] = {}
+        self.exact_components = 0
+        self.sampled_components = 0
+        self.cache_hits = 0
+        self.skipped_components = 0
+        self.partial_components = 0
+        self.last_state: Optional[Tuple] = None
+
+    def observe(self, cell: Tuple[int, int], perceptions: Set[Object], adjacent_cells: Tuple[Tuple[int, int], ...]):
+        for perception, danger in PERCEPT_DANGERS:
+            if danger not in self.priors:
+                continue
+            self.clear[danger].add(cell)
+            if perception in perceptions:
+                self.required[danger][cell] = frozenset(adjacent_cells)
+            else:
+                self.required[danger].pop(cell, None)
+                self.clear[danger].update(adjacent_cells)
+        self.marginals.clear()
+
+    def remove(self, cell: Tuple[int, int], danger: Object):
+        # A removed danger, like a killed Wumpus, explains the percepts around it
+        self.clear[danger].add(cell)
+        required = self.required[danger]
+        for visited in [visited for visited, constraint in required.items() if cell in constraint]:
+            del required[visited]
+        self.marginals.clear()
+
+    def snapshot(self) -> Tuple:
+        previous = self.last_state[0] if self.last_state else {}
+        self.last_state = ({danger: freeze_set(clear, previous.get(danger)) for danger, clear in self.clear.items()},
+                           {danger: dict(required) for danger, required in self.required.items()})
+        return self.last_state
+
+    def restore(self, state: Tuple):
+        clear, required = state
+        self.clear = {danger: thaw_set(cells) for danger, cells in clear.items()}
+        self.required = {danger: dict(constraints) for danger, constraints in required.items()}
+        # Component marginals only depend on the component, so the cache stays
+        self.marginals.clear()
+        self.last_state = state
+
+    def danger_probability(self, danger: Object, cell: Tuple[int, int]) -> float:
+        if cell in self.clear[danger]:
+            return 0.0
+        if danger not in self.marginals:
+            self.marginals[danger] = self.solve(danger)
+        return self.marginals[danger].get(cell, self.priors[danger])
+
+    def risk(self, cell: Tuple[int, int]) -> float:
+        # Chance that the square holds at least one danger
+        safe = 1.0
+        for danger in self.priors:
+            safe *= 1 - self.danger_probability(danger, cell)
+        return 1 - safe
+
+    def risks(self, cells: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], float]:
+        return {cell: self.risk(cell) for cell in cells}
+
+    def solve(self, danger: Object) -> Dict[Tuple[int, int], float]:
+        clear = self.clear[danger]
+        # Empty constraints contradict the percepts, e.g. after a miss, and are ignored
+        constraints = {constraint - clear for constraint in self.required[danger].values()}
+        constraints.discard(frozenset())
+
+        marginals = {}
+        deadline = time.perf_counter() + self.budget_ms / 1000
+        for component in self.components(constraints):
+            key = (danger, component)
+            if key in self.component_cache:
+                self.cache_hits += 1
+                marginals.update(self.component_cache[key])
+                continue
+            if time.perf_counter() >= deadline:
+                # Over budget: the cells keep their prior until a later call counts them
+                self.skipped_components += 1
+                continue
+
+            component_marginals, complete = self.count(component, self.priors[danger], deadline)
+            if complete:
+                self.component_cache[key] = component_marginals
+            else:
+                # Counted again from scratch by a later call with time to finish
+                self.partial_components += 1
+            marginals.update(component_marginals)
+        return marginals
+
+    def count(self, component: FrozenSet[Constraint], prior: float,
+              deadline: float) -> Tuple[Dict[Tuple[int, int], float], bool]:
+        # Marginals of the component, and whether they are final
+        constraints = sorted(component, key=sorted)
+        cells = sorted(set().union(*constraints))
+        if len(cells) <= self.exact_limit:
+            self.exact_components += 1
+            return exact_marginals(cells, constraints, prior), True
+        self.sampled_components += 1
+        marginals, taken = sampled_marginals(cells, constraints, prior, self.samples, deadline)
+        return marginals, taken >= self.samples
+
+    @staticmethod
+    def components(constraints: Set[Constraint]) -> List[FrozenSet[Constraint]]:
+        by_cell: Dict[Tuple[int, int], List[Constraint]] = {}
+        for constraint in constraints:
+            for cell in constraint:
+                by_cell.setdefault(cell, []).append(constraint)
+
+        components = []
+        seen = set()
+        for constraint in constraints:
+            if constraint in seen:
+                continue
+            seen.add(constraint)
+            component, stack = [], [constraint]
+            while stack:
+                current = stack.pop()
+                component.append(current)
+                for cell in current:
+                    for other in by_cell[cell]:
+                        if other not in seen:
+                            seen.add(other)
+                            stack.append(other)
+            components.append(frozenset(component))
+        return components
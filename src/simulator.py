@@ -0,0 +1,281 @@
+from utils import *
+from program import Map, MapState
+from algorithm import AgentBrain, BrainState
+from collections import deque
+from typing import FrozenSet, NamedTuple, Tuple, Set, Optional
+
+# Score change for each action
+ACTION_SCORES = {
+    Action.MOVE_FORWARD: -10,
+    Action.TURN_LEFT: -10,
+    Action.TURN_RIGHT: -10,
+    Action.SHOOT: -100,
+    Action.GRAB_G: 5000,
+    Action.GRAB_HP: 0,
+    Action.CLIMB: 10,
+}
+
+DEATH_PENALTY = -10000
+GAS_DAMAGE = 25
+POTION_HEALING = 25
+MAX_HEALTH = 100
+MAX_STEPS = 10000
+
+# Outcomes
+OUTCOME_RUNNING = "RUNNING"
+OUTCOME_CLIMB = "CLIMB"
+OUTCOME_DIE = "DIE"
+OUTCOME_TIMEOUT = "TIMEOUT"
+
+
+class EpisodeSnapshot(NamedTuple):
+    map: MapState
+    brain: BrainState
+    is_alive: bool
+    health: int
+    score: int
+    steps: int
+    game_over: bool
+    outcome: str
+    last_action: Optional[Action]
+    last_perceptions: FrozenSet[Object]
+
+
+class Simulator:
+    def __init__(self, map: Map, brain: AgentBrain, max_steps: int = MAX_STEPS):
+        self.map = map
+        self.brain = brain
+        self.max_steps = max_steps
+        self.observers = []
+
+        self.is_alive = True
+        self.health = MAX_HEALTH
+        self.score = 0
+        self.steps = 0
+        self.game_over = False
+        self.outcome = OUTCOME_RUNNING
+        self.last_action: Optional[Action] = None
+        self.last_perceptions: Set[Object] = set()
+        self.start_position = (self.map.size - 1, 0)
+
+        first_cell = self.map.get_cell(*self.map.agent_position)
+        first_cell.discover()
+        first_cell.mark_visited()
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def notify(self, event: str, *args):
+        # Observers only implement the events they care about
+        for observer in self.observers:
+            handler = getattr(observer, f"on_{event}", None)
+            if handler is not None:
+                handler(*args)
+
+    def perceive(self) -> Set[Object]:
+        cell = self.map.get_cell(*self.map.agent_position)
+        perceptions = set()
+        for perception in [Object.STENCH, Object.BREEZE, Object.GLOW, Object.WHIFF]:
+            if cell.has_content(perception):
+                perceptions.add(perception)
+
+        return perceptions
+
+    def step(self) -> Optional[Action]:
+        if self.game_over:
+            return None
+
+        last_position = self.map.agent_position
+        current_cell = self.map.get_cell(*last_position)
+        perceptions = self.perceive()
+        self.last_perceptions = perceptions
+
+        # Agent makes a decision
+        action = self.brain.make_decision(perceptions)
+        self.steps += 1
+        self.last_action = action
+        self.score += ACTION_SCORES.get(action, 0)
+
+        if action == Action.MOVE_FORWARD:
+            self.move_forward()
+        elif action == Action.SHOOT:
+            self.shoot()
+        elif action in [Action.GRAB_G, Action.GRAB_HP]:
+            self.grab()
+
+        # Update game state based on action
+        if action == Action.MOVE_FORWARD:
+            new_cell = self.map.get_cell(*self.map.agent_position)
+
+            # Check for game over conditions
+            if new_cell.has_content(Object.WUMPUS) or new_cell.has_content(Object.PIT):
+                self.die()
+            elif new_cell.has_content(Object.GOLD):
+                self.brain.has_gold = True
+                new_cell.remove_content(Object.GOLD)
+            elif new_cell.has_content(Object.POISONOUS_GAS):
+                self.health = max(0, self.health - GAS_DAMAGE)
+                if self.health == 0:
+                    self.die()
+
+        elif action == Action.GRAB_G:
+            current_cell.remove_content(Object.GOLD)
+            self.brain.has_gold = True
+
+        elif action == Action.GRAB_HP:
+            self.health = min(MAX_HEALTH, self.health + POTION_HEALING)
+
+        self.notify("step", self, action, last_position)
+
+        # Check if agent wants to climb out
+        if not self.is_alive:
+            self.finish(OUTCOME_DIE)
+        elif self.map.agent_position == self.start_position and self.brain.has_gold:
+            self.last_action = Action.CLIMB
+            self.finish(OUTCOME_CLIMB)
+        elif self.steps >= self.max_steps:
+            self.finish(OUTCOME_TIMEOUT)
+
+        return action
+
+    def run(self) -> str:
+        while not self.game_over:
+            self.step()
+        return self.outcome
+
+    def finish(self, outcome: str):
+        self.game_over = True
+        self.outcome = outcome
+        self.notify("game_over", self, self.last_action)
+
+    def snapshot(self) -> EpisodeSnapshot:
+        return EpisodeSnapshot(self.map.snapshot(), self.brain.snapshot(), self.is_alive, self.health, self.score,
+                               self.steps, self.game_over, self.outcome, self.last_action,
+                               frozenset(self.last_perceptions))
+
+    def restore(self, snapshot: EpisodeSnapshot):
+        # Recording observers drop the steps after the snapshot on the restore event
+        self.map.restore(snapshot.map)
+        self.brain.restore(snapshot.brain)
+        self.is_alive = snapshot.is_alive
+        self.health = snapshot.health
+        self.score = snapshot.score
+        self.steps = snapshot.steps
+        self.game_over = snapshot.game_over
+        self.outcome = snapshot.outcome
+        self.last_action = snapshot.last_action
+        self.last_perceptions = set(snapshot.last_perceptions)
+        self.notify("restore", self)
+
+    def move_forward(self):
+        new_position = self.get_forward_position()
+        if self.map.is_valid_position(*new_position):
+            self.map.agent_position = new_position
+            new_cell = self.map.get_cell(*new_position)
+            new_cell.discover()
+            new_cell.mark_visited()
+
+    def shoot(self):
+        target_position = self.get_forward_position()
+        if not self.map.is_valid_position(*target_position):
+            return
+        if self.fire_arrow(target_position):
+            return
+
+        # Missed, rotate to the right and shoot again
+        self.brain.direction = ROTATE_RIGHT[self.brain.direction]
+        target_position = self.get_forward_position()
+        if self.map.is_valid_position(*target_position) and self.fire_arrow(target_position):
+            return
+
+        # Missed again, turn around and shoot one last time
+        self.brain.direction = OPPOSITE[self.brain.direction]
+        target_position = self.get_forward_position()
+        if self.map.is_valid_position(*target_position):
+            self.fire_arrow(target_position)
+
+    def fire_arrow(self, target_position: Tuple[int, int]) -> bool:
+        self.notify("arrow", self.map.agent_position, self.brain.direction)
+
+        target_cell = self.map.get_cell(*target_position)
+        if not target_cell.has_content(Object.WUMPUS):
+            return False
+
+        # Remove Wumpus from the cell
+        target_cell.remove_content(Object.WUMPUS)
+
+        # Remove Stench from adjacent cells
+        for adj_x, adj_y in self.map.get_adjacent_cells(*target_position):
+            self.map.get_cell(adj_x, adj_y).remove_content(Object.STENCH)
+
+        # Update brain's knowledge
+        self.brain.process_successful_shot(target_position)
+
+        self.notify("scream", target_position)
+        return True
+
+    def grab(self):
+        x, y = self.map.agent_position
+        cell = self.map.get_cell(x, y)
+
+        if self.map.agent_position in self.map.gold_positions:
+            self.brain.has_gold = True
+            cell.remove_content(Object.GOLD)
+            self.map.gold_positions.remove((x, y))
+            self.brain.update_knowledge_after_grab(Object.GOLD, (x, y))
+
+        elif self.map.agent_position in self.map.healing_positions:
+            cell.remove_content(Object.HEALING_POTIONS)
+            self.map.healing_positions.remove((x, y))
+            self.brain.update_knowledge_after_grab(Object.HEALING_POTIONS, (x, y))
+
+            # Remove GLOW from adjacent cells
+            for adj_x, adj_y in self.map.get_adjacent_cells(x, y):
+                self.map.get_cell(adj_x, adj_y).remove_content(Object.GLOW)
+
+    def get_forward_position(self) -> Tuple[int, int]:
+        x, y = self.map.agent_position
+        dx, dy = DIRECTION_DELTAS[self.brain.direction]
+        return (x + dx, y + dy)
+
+    def die(self):
+        self.is_alive = False
+        self.score += DEATH_PENALTY
+
+
+class UndoHistory:
+    # Full snapshots are only taken every few steps. Undoing to a step in
+    # between restores the snapshot before it and runs the episode forward
+    # again, which repeats the same decisions.
+    def __init__(self, simulator: Simulator, steps: int = UNDO_STEPS, interval: int = UNDO_KEYFRAME_STEPS):
+        self.simulator = simulator
+        self.interval = interval
+        self.keyframes = deque(maxlen=steps // interval + 1)
+
+    def record(self):
+        # Called before every step
+        steps = self.simulator.steps
+        if steps % self.interval == 0 and (not self.keyframes or self.keyframes[-1].steps != steps):
+            self.keyframes.append(self.simulator.snapshot())
+
+    def can_undo(self) -> bool:
+        return bool(self.keyframes) and self.simulator.steps > self.keyframes[0].steps
+
+    def undo(self):
+        target = self.simulator.steps - 1
+        while self.keyframes[-1].steps > target:
+            self.keyframes.pop()
+
+        # Observers only see the restored step, not the steps run again
+        observers = self.simulator.observers
+        self.simulator.observers = []
+        try:
+            self.simulator.restore(self.keyframes[-1])
+            while self.simulator.steps < target:
+                self.simulator.step()
+        finally:
+            self.simulator.observers = observers
+        self.simulator.notify("restore", self.simulator)
+
+    def clear(self):
+        self.keyframes.clear()
@@ -0,0 +1,164 @@
+from abc import ABC, abstractmethod
+from pysat.solvers import Glucose3, Cadical153, Minisat22
+from typing import Dict, List
+
+DEFAULT_SOLVER = "glucose3"
+POOL_SIZE = 4
+
+
+class SatSolver(ABC):
+    # Common interface of the knowledge base engines. reset() empties the
+    # solver so it can be handed to the next episode, delete() frees it.
+    name = ""
+
+    @abstractmethod
+    def add_clause(self, clause: List[int]):
+        ...
+
+    @abstractmethod
+    def solve(self, assumptions: List[int] = ()) -> bool:
+        ...
+
+    @abstractmethod
+    def reset(self):
+        ...
+
+    @abstractmethod
+    def delete(self):
+        ...
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.delete()
+
+
+class PysatSolver(SatSolver):
+    # Native pysat solvers cannot drop clauses, so a reset replaces the instance
+    def __init__(self, name: str, solver_class):
+        self.name = name
+        self.solver_class = solver_class
+        self.solver = solver_class()
+
+    def add_clause(self, clause: List[int]):
+        self.solver.add_clause(clause)
+
+    def solve(self, assumptions: List[int] = ()) -> bool:
+        return self.solver.solve(assumptions=list(assumptions))
+
+    def reset(self):
+        self.delete()
+        self.solver = self.solver_class()
+
+    def delete(self):
+        if self.solver is not None:
+            self.solver.delete()
+            self.solver = None
+
+
+class LocalSolver(SatSolver):
+    # Pure-Python DPLL, enough for the small knowledge bases of one episode
+    name = "local"
+
+    def __init__(self):
+        self.clauses: List[List[int]] = []
+
+    def add_clause(self, clause: List[int]):
+        self.clauses.append(list(clause))
+
+    def solve(self, assumptions: List[int] = ()) -> bool:
+        values = {}
+        for literal in assumptions:
+            if values.get(abs(literal), literal > 0) != (literal > 0):
+                return False
+            values[abs(literal)] = literal > 0
+        return self.search(values)
+
+    def propagate(self, values: Dict[int, bool]) -> bool:
+        changed = True
+        while changed:
+            changed = False
+            for clause in self.clauses:
+                unassigned = []
+                for literal in clause:
+                    value = values.get(abs(literal))
+                    if value is None:
+                        unassigned.append(literal)
+                    elif value == (literal > 0):
+                        break
+                else:
+                    if not unassigned:
+                        return False
+                    if len(unassigned) == 1:
+                        values[abs(unassigned[0])] = unassigned[0] > 0
+                        changed = True
+        return True
+
+    def search(self, values: Dict[int, bool]) -> bool:
+        if not self.propagate(values):
+            return False
+        for clause in self.clauses:
+            if any(values.get(abs(literal)) == (literal > 0) for literal in clause):
+                continue
+            literal = next(literal for literal in clause if abs(literal) not in values)
+            for choice in [literal, -literal]:
+                trial = dict(values)
+                trial[abs(choice)] = choice > 0
+                if self.search(trial):
+                    return True
+            return False
+        return True
+
+    def reset(self):
+        self.clauses = []
+
+    def delete(self):
+        self.clauses = []
+
+
+SOLVER_BACKENDS = {
+    "glucose3": lambda: PysatSolver("glucose3", Glucose3),
+    "cadical": lambda: PysatSolver("cadical", Cadical153),
+    "minisat": lambda: PysatSolver("minisat", Minisat22),
+    "local": LocalSolver,
+}
+
+
+def make_solver(name: str = DEFAULT_SOLVER) -> SatSolver:
+    if name not in SOLVER_BACKENDS:
+        raise ValueError(f"Unknown solver: {name}")
+    return SOLVER_BACKENDS[name]()
+
+
+class SolverPool:
+    # Reset solvers waiting for the next episode; anything beyond the pool
+    # size is deleted on release so long batches keep a flat memory profile.
+    # Only the local engine is emptied in place: resetting a native pysat
+    # solver builds a new instance, so for those backends the pool just has
+    # the next solver ready before the episode starts.
+    def __init__(self, name: str = DEFAULT_SOLVER, size: int = POOL_SIZE):
+        self.name = name
+        self.size = size
+        self.idle: List[SatSolver] = []
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self) -> SatSolver:
+        if self.idle:
+            self.reused += 1
+            return self.idle.pop()
+        self.created += 1
+        return make_solver(self.name)
+
+    def release(self, solver: SatSolver):
+        if len(self.idle) < self.size:
+            solver.reset()
+            self.idle.append(solver)
+        else:
+            solver.delete()
+
+    def close(self):
+        for solver in self.idle:
+            solver.delete()
+        self.idle = []
@@ -0,0 +1,15 @@
+from itertools import product
+from knowledge import KB_OBJECTS, VariableIndex
+
+
+def test_variables_are_unique():
+    for size in [1, 2, 4, 10]:
+        index = VariableIndex(size)
+        pairs = list(product(range(size), range(size), KB_OBJECTS))
+        variables = {index.get(x, y, obj) for x, y, obj in pairs}
+
+        # No two (cell, object) pairs share a variable, and none is left unused
+        assert len(variables) == size * size * len(KB_OBJECTS)
+        assert variables == set(range(1, index.num_variables + 1))
+        for x, y, obj in pairs:
+            assert index.lookup(index.get(x, y, obj)) == ((x, y), obj)
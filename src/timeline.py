@@ -0,0 +1,111 @@
+from utils import STEPS_PER_SECOND, MAX_STEPS_PER_FRAME
+from typing import Dict, List, Optional
+
+# Overlay durations in milliseconds
+ARROW_DURATION = 500
+SCREAM_DURATION = 500
+BANNER_DURATION = 2000
+
+# Simulation speed multipliers, None runs as many steps as a frame allows
+SPEEDS = [1, 2, 4, 8, 16, None]
+
+
+class Overlay:
+    def __init__(self, image, rect, start: int, end: int):
+        self.image = image
+        self.rect = rect
+        self.start = start
+        self.end = end
+
+    def is_visible(self, now: int) -> bool:
+        return self.start <= now < self.end
+
+
+class Timeline:
+    # Timed overlays driven by the main loop instead of blocking waits.
+    # Overlays on the same channel play one after another.
+    def __init__(self, turbo: bool = False):
+        self.turbo = turbo
+        self.now = 0
+        self.overlays: List[Overlay] = []
+        self.channel_end: Dict[str, int] = {}
+
+    def add(self, channel: str, image, rect, duration: int):
+        if self.turbo:
+            return
+        start = max(self.now, self.channel_end.get(channel, 0))
+        self.channel_end[channel] = start + duration
+        self.overlays.append(Overlay(image, rect, start, start + duration))
+
+    def update(self, now: int) -> List:
+        # Advance the clock and return the rects of overlays that just finished
+        self.now = now
+        finished = [overlay.rect for overlay in self.overlays if overlay.end <= now]
+        if finished:
+            self.overlays = [overlay for overlay in self.overlays if overlay.end > now]
+        return finished
+
+    def visible(self) -> List[Overlay]:
+        return [overlay for overlay in self.overlays if overlay.is_visible(self.now)]
+
+    def set_turbo(self, turbo: bool) -> List:
+        # Dropping the overlays returns their rects so they can be cleared
+        self.turbo = turbo
+        if not turbo:
+            return []
+        dropped = [overlay.rect for overlay in self.overlays]
+        self.overlays = []
+        self.channel_end.clear()
+        return dropped
+
+
+class FixedStepper:
+    # Fixed-timestep simulation clock, independent of the render frame rate
+    def __init__(self, steps_per_second: int = STEPS_PER_SECOND, max_steps_per_frame: int = MAX_STEPS_PER_FRAME):
+        self.step_interval = 1000 / steps_per_second
+        self.max_steps_per_frame = max_steps_per_frame
+        self.accumulator = 0.0
+        self.speed_index = 0
+        self.paused = False
+        self.pending_steps = 0
+
+    @property
+    def speed(self) -> Optional[int]:
+        return SPEEDS[self.speed_index]
+
+    def steps_due(self, elapsed: int) -> int:
+        # Number of simulation steps to run for a frame that took elapsed ms
+        if self.paused:
+            steps, self.pending_steps = self.pending_steps, 0
+            return steps
+        if self.speed is None:
+            return self.max_steps_per_frame
+
+        self.accumulator += elapsed * self.speed
+        steps = int(self.accumulator // self.step_interval)
+        if steps > self.max_steps_per_frame:
+            # Drop the backlog instead of trying to catch up forever
+            self.accumulator = 0.0
+            return self.max_steps_per_frame
+        self.accumulator -= steps * self.step_interval
+        return steps
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+        self.accumulator = 0.0
+
+    def single_step(self):
+        if self.paused:
+            self.pending_steps += 1
+
+    def faster(self):
+        self.speed_index = min(self.speed_index + 1, len(SPEEDS) - 1)
+
+    def slower(self):
+        self.speed_index = max(self.speed_index - 1, 0)
+        self.accumulator = 0.0
+
+    def status(self) -> str:
+        if self.paused:
+            return "PAUSED"
+        return "SPEED: MAX" if self.speed is None else f"SPEED: x{self.speed}"
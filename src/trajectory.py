@@ -0,0 +1,93 @@
+import json
+from utils import *
+from typing import Tuple
+
+FORMAT_TEXT = "text"
+FORMAT_JSONL = "jsonl"
+TRAJECTORY_FORMATS = [FORMAT_TEXT, FORMAT_JSONL]
+
+# Writes are buffered in memory and hit the disk once this many bytes pile up
+BUFFER_SIZE = 64 * 1024
+
+ACTION_NAMES = {
+    Action.MOVE_FORWARD: "Move forward",
+    Action.TURN_LEFT: "Turn left",
+    Action.TURN_RIGHT: "Turn right",
+    Action.SHOOT: "Shoot",
+    Action.GRAB_G: "Grab gold",
+    Action.GRAB_HP: "Grab health potion",
+    Action.CLIMB: "Climb"
+}
+
+
+class TrajectoryWriter:
+    def __init__(self, filepath: str, format: str = FORMAT_TEXT, buffer_size: int = BUFFER_SIZE):
+        if format not in TRAJECTORY_FORMATS:
+            raise ValueError(f"Invalid trajectory format: {format}")
+
+        self.filepath = filepath
+        self.format = format
+        self.file = open(filepath, "w", buffering=buffer_size)
+        # Bytes written before each step's line, to drop undone steps.
+        # Lines are ASCII, so characters and bytes are the same.
+        self.written = 0
+        self.step_offsets = [0]
+
+    # Simulator observer events
+    def on_step(self, simulator, action, last_position):
+        if self.format == FORMAT_TEXT:
+            self.write_text_action(simulator, action, last_position)
+        else:
+            self.write_record(simulator, action, last_position)
+        self.step_offsets.append(self.written)
+
+    def on_game_over(self, simulator, action):
+        if self.format == FORMAT_TEXT:
+            self.write_text_action(simulator, action, simulator.map.agent_position)
+            if not simulator.is_alive:
+                self.write("Agent die in Wumpus World\n")
+            self.write("------------------------------\n")
+            self.write(f"SCORE: {simulator.score}\n")
+            self.write(f"HEALTH: {simulator.health}\n")
+        else:
+            self.write(json.dumps({
+                "step": simulator.steps,
+                "outcome": simulator.outcome,
+                "score": simulator.score,
+                "health": simulator.health,
+            }) + "\n")
+        self.close()
+
+    def on_restore(self, simulator):
+        if self.file.closed:
+            return
+        del self.step_offsets[simulator.steps + 1:]
+        self.written = self.step_offsets[-1]
+        self.file.truncate(self.written)
+        self.file.seek(0, 2)
+
+    def write(self, line: str):
+        self.file.write(line)
+        self.written += len(line)
+
+    def map_position(self, simulator, position: Tuple[int, int]) -> Tuple[int, int]:
+        x, y = position
+        return (simulator.map.size - x, y + 1)
+
+    def write_text_action(self, simulator, action, position):
+        action_str = ACTION_NAMES.get(action, "Unknown action")
+        self.write(f"{self.map_position(simulator, position)}: {action_str}\n")
+
+    def write_record(self, simulator, action, position):
+        self.write(json.dumps({
+            "step": simulator.steps,
+            "action": action.name if action is not None else None,
+            "position": self.map_position(simulator, position),
+            "perceptions": sorted(perception.name for perception in simulator.last_perceptions),
+            "score": simulator.score,
+            "health": simulator.health,
+        }) + "\n")
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
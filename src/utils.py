@@ -1,11 +1,16 @@
 from enum import Enum, auto
-import pygame
 
 # Game Parameters
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 CAPTION = "Wumpus World"
 FPS = 10
+RENDER_FPS = 60
+STEPS_PER_SECOND = 10
+MAX_STEPS_PER_FRAME = 200
+UNDO_STEPS = 500
+UNDO_KEYFRAME_STEPS = 32
+REPLAY_JUMP = 100
 
 # Colors
 WHITE = "#FFFFFF"
@@ -91,6 +96,11 @@ class Object(Enum):
     SCREAM = "S_C"
 
 
+# One bit per object, used by the compact grid representations
+OBJECT_BITS = {obj: 1 << index for index, obj in enumerate(Object)}
+DANGER_BITS = OBJECT_BITS[Object.WUMPUS] | OBJECT_BITS[Object.PIT] | OBJECT_BITS[Object.POISONOUS_GAS]
+
+
 # Actions
 class Action(Enum):
     MOVE_FORWARD = auto()
@@ -108,3 +118,41 @@ class Direction(Enum):
     DOWN = auto()
     LEFT = auto()
     RIGHT = auto()
+
+
+DIRECTION_DELTAS = {
+    Direction.UP: (-1, 0),
+    Direction.DOWN: (1, 0),
+    Direction.LEFT: (0, -1),
+    Direction.RIGHT: (0, 1),
+}
+
+ROTATE_RIGHT = {
+    Direction.UP: Direction.RIGHT,
+    Direction.RIGHT: Direction.DOWN,
+    Direction.DOWN: Direction.LEFT,
+    Direction.LEFT: Direction.UP,
+}
+
+OPPOSITE = {
+    Direction.UP: Direction.DOWN,
+    Direction.DOWN: Direction.UP,
+    Direction.LEFT: Direction.RIGHT,
+    Direction.RIGHT: Direction.LEFT,
+}
+
+# Action turning from the first heading to the second one
+TURN_ACTIONS = {
+    (Direction.UP, Direction.RIGHT): Action.TURN_RIGHT,
+    (Direction.UP, Direction.DOWN): Action.TURN_RIGHT,
+    (Direction.UP, Direction.LEFT): Action.TURN_LEFT,
+    (Direction.RIGHT, Direction.DOWN): Action.TURN_RIGHT,
+    (Direction.RIGHT, Direction.LEFT): Action.TURN_RIGHT,
+    (Direction.RIGHT, Direction.UP): Action.TURN_LEFT,
+    (Direction.DOWN, Direction.LEFT): Action.TURN_RIGHT,
+    (Direction.DOWN, Direction.UP): Action.TURN_RIGHT,
+    (Direction.DOWN, Direction.RIGHT): Action.TURN_LEFT,
+    (Direction.LEFT, Direction.UP): Action.TURN_RIGHT,
+    (Direction.LEFT, Direction.RIGHT): Action.TURN_RIGHT,
+    (Direction.LEFT, Direction.DOWN): Action.TURN_LEFT,
+}